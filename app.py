@@ -1,17 +1,43 @@
 # app.py - 修正版（DBリセット時のセッションエラー対策済み）
 
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session, make_response, send_from_directory, abort
 from flask_sqlalchemy import SQLAlchemy
+from markupsafe import Markup
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateTable
+from sqlalchemy import func, or_, and_, case, inspect, select, text, event
 from flask_apscheduler import APScheduler
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 from datetime import datetime, timedelta
 import random
 import os
+import gzip
+import json
+import math
+import mimetypes
+import socket
+import threading
+import time
+import traceback
+import uuid
 from dotenv import load_dotenv
 import google.generativeai as genai
 import requests
 import string
+from cache import create_cache
+from profiling import Profiler
+
+# 高速な JSON エンコーダと brotli 圧縮は、インストールされていれば使う
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 load_dotenv()
 app = Flask(__name__)
@@ -21,9 +47,72 @@ app.config['SESSION_COOKIE_NAME'] = 'social_keeper_session'
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///social_keeper.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///social_keeper.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Web とワーカーの複数プロセスから同じ SQLite に書き込むため、ロック待ちを長めにとる
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+# ジョブキュー: JOB_WORKERS は python app.py で起動したときに同じプロセスで動かすワーカー数
+app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', '1'))
+app.config['JOB_POLL_INTERVAL'] = float(os.getenv('JOB_POLL_INTERVAL', '1.0'))
+app.config['JOB_LOCK_TIMEOUT'] = int(os.getenv('JOB_LOCK_TIMEOUT', '300'))
+# 完了（done）から JOB_RETENTION_HOURS を過ぎたジョブを消す。間隔 0 で無効
+app.config['JOB_RETENTION_HOURS'] = int(os.getenv('JOB_RETENTION_HOURS', '24'))
+app.config['JOB_PRUNE_INTERVAL_MINUTES'] = int(os.getenv('JOB_PRUNE_INTERVAL_MINUTES', '60'))
+# worker.py など、締め切りチェックを動かさないプロセスでは 0 にする
+app.config['SCHEDULER_ENABLED'] = os.getenv('SCHEDULER_ENABLED', '1') == '1'
+# クライアントのポーリング間隔（秒）。X-Poll-Interval ヘッダで推奨値を返す
+app.config['POLL_MIN_SECONDS'] = int(os.getenv('POLL_MIN_SECONDS', '2'))
+app.config['POLL_MAX_SECONDS'] = int(os.getenv('POLL_MAX_SECONDS', '60'))
+app.config['DASHBOARD_POLL_SECONDS'] = int(os.getenv('DASHBOARD_POLL_SECONDS', '60'))
+app.config['RANKING_POLL_SECONDS'] = int(os.getenv('RANKING_POLL_SECONDS', '30'))
+# 管理者（プロファイル一覧などを見られるユーザー名、カンマ区切り）
+app.config['ADMIN_USERNAMES'] = [u.strip() for u in os.getenv('ADMIN_USERNAMES', '').split(',') if u.strip()]
+# プロファイリング（詳細は profiling.py）
+app.config['PROFILE_ENABLED'] = os.getenv('PROFILE_ENABLED', '0') == '1'
+app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', '0.01'))
+app.config['PROFILE_ENDPOINTS'] = [e.strip() for e in os.getenv('PROFILE_ENDPOINTS', '').split(',') if e.strip()]
+app.config['PROFILE_MODE'] = os.getenv('PROFILE_MODE', 'sample')
+app.config['PROFILE_DEADLINES'] = os.getenv('PROFILE_DEADLINES', '0') == '1'
+if os.getenv('PROFILE_DIR'):
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR')
+# この値より小さいレスポンスは圧縮しない（ヘッダ分で逆に大きくなるため）
+app.config['API_COMPRESS_MIN_BYTES'] = int(os.getenv('API_COMPRESS_MIN_BYTES', '1024'))
+# キャッシュ: local（プロセス内のみ） / sqlite / redis。sqlite と redis はワーカー間で共有される
+app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'local')
+# CACHE_URL を省略したときの既定値は create_cache がバックエンドごとに決める（sqlite だけは instance/ に置く）
+app.config['CACHE_URL'] = os.getenv('CACHE_URL') or (
+    os.path.join(app.instance_path, 'cache.sqlite3') if app.config['CACHE_BACKEND'] == 'sqlite' else None
+)
+app.config['CACHE_MAX_ENTRIES'] = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+# 画面の断片（統計・バッジ・グループのパネル）をキャッシュする秒数。0 で無効
+app.config['FRAGMENT_CACHE_TTL'] = int(os.getenv('FRAGMENT_CACHE_TTL', '600'))
+# build_assets.py が書き出したハッシュ付きの静的ファイルを使う（マニフェストが無ければ元のファイル）。
+# 開発中（python app.py）は static/ の編集がそのまま反映されるよう既定で無効。gunicorn.conf.py が有効にする
+app.config['STATIC_FINGERPRINT'] = os.getenv('STATIC_FINGERPRINT', '0') == '1'
+# 完了・処刑済みで ARCHIVE_AFTER_DAYS を過ぎたタスクを tasks_archive に移す。間隔 0 で無効
+app.config['ARCHIVE_AFTER_DAYS'] = int(os.getenv('ARCHIVE_AFTER_DAYS', '30'))
+app.config['ARCHIVE_BATCH_SIZE'] = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+app.config['ARCHIVE_BATCH_PAUSE'] = float(os.getenv('ARCHIVE_BATCH_PAUSE', '0.05'))
+app.config['ARCHIVE_INTERVAL_MINUTES'] = int(os.getenv('ARCHIVE_INTERVAL_MINUTES', '60'))
+# 処刑通知: 同じ通知先への処刑をこの秒数だけ待ってまとめ、1通のダイジェストで投稿する
+app.config['WEBHOOK_DIGEST_WINDOW'] = int(os.getenv('WEBHOOK_DIGEST_WINDOW', '10'))
+# グループに登録できる Webhook URL の接頭辞（カンマ区切り）。任意の URL へ投稿させないため
+app.config['WEBHOOK_ALLOWED_PREFIXES'] = [p.strip() for p in os.getenv(
+    'WEBHOOK_ALLOWED_PREFIXES', 'https://discord.com/api/webhooks/,https://discordapp.com/api/webhooks/'
+).split(',') if p.strip()]
 db = SQLAlchemy(app)
+cache = create_cache(app.config)
+profiler = Profiler(app)
+
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        @event.listens_for(db.engine, 'connect')
+        def set_sqlite_pragma(dbapi_connection, connection_record):
+            # WAL にすると書き込み中も他プロセスから読める
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.close()
 
 try:
     api_key = os.getenv("GOOGLE_API_KEY")
@@ -43,6 +132,11 @@ class User(db.Model):
     display_name = db.Column(db.String(100))
     bio = db.Column(db.String(500))
     created_at = db.Column(db.DateTime, default=datetime.now)
+    # 処刑通知フィード: 最後に割り当てた通番と、クライアントが受信確認した通番
+    punish_seq = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    punish_ack_seq = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    # 画面の断片キャッシュの版数。統計・バッジ・所属グループが変わるたびに増やす
+    data_revision = db.Column(db.Integer, default=0, nullable=False, server_default='0')
     
     stats = db.relationship('UserStats', uselist=False, back_populates='user')
     tasks = db.relationship('Task', back_populates='user')
@@ -68,6 +162,10 @@ class UserStats(db.Model):
     max_streak = db.Column(db.Integer, default=0)
     laziness_score = db.Column(db.Float, default=0.0)
     last_activity = db.Column(db.DateTime, default=datetime.now)
+    # tasks_archive に移したタスクの件数。統計はこれと tasks の集計を足して求め、アーカイブは読まない
+    archived_tasks = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    archived_completed = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    archived_punished = db.Column(db.Integer, default=0, nullable=False, server_default='0')
     
     user = db.relationship('User', back_populates='stats')
     
@@ -90,6 +188,12 @@ class UserStats(db.Model):
 
 class Task(db.Model):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        db.Index('ix_tasks_user_punish_seq', 'user_id', 'punish_seq'),
+        db.Index('ix_tasks_user_pending_deadline', 'user_id', 'is_completed', 'is_punished', 'deadline'),
+        # 古い行を tasks_archive へ移して消すので、最大の id が消えても同じ id を払い出さないようにする
+        {'sqlite_autoincrement': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -100,6 +204,9 @@ class Task(db.Model):
     is_completed = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
     completed_at = db.Column(db.DateTime)
+    praise_text = db.Column(db.String(500))
+    punished_at = db.Column(db.DateTime)
+    punish_seq = db.Column(db.Integer)
     
     user = db.relationship('User', back_populates='tasks')
     
@@ -113,6 +220,37 @@ class Task(db.Model):
             'is_completed': self.is_completed,
             'created_at': self.created_at.isoformat()
         }
+    
+    def to_punishment_dict(self):
+        return {
+            'id': self.id,
+            'seq': self.punish_seq,
+            'title': self.title,
+            'penalty_text': self.penalty_text,
+            'punished_at': self.punished_at.isoformat() if self.punished_at else None
+        }
+
+
+class ArchivedTask(db.Model):
+    # 完了・処刑済みの古いタスクの保管先（列は tasks と同じ、id もそのまま引き継ぐ）
+    __tablename__ = 'tasks_archive'
+    __table_args__ = (
+        db.Index('ix_tasks_archive_user_id', 'user_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    title = db.Column(db.String(200), nullable=False)
+    deadline = db.Column(db.DateTime)
+    penalty_text = db.Column(db.String(500))
+    is_punished = db.Column(db.Boolean, default=False)
+    is_completed = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    completed_at = db.Column(db.DateTime)
+    praise_text = db.Column(db.String(500))
+    punished_at = db.Column(db.DateTime)
+    punish_seq = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime, default=datetime.now)
 
 
 class Group(db.Model):
@@ -123,8 +261,22 @@ class Group(db.Model):
     invite_code = db.Column(db.String(10), unique=True)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=datetime.now)
+    # メンバーの処刑を投稿する Discord の Webhook（作成者が設定する）
+    webhook_url = db.Column(db.String(500))
     
     members = db.relationship('GroupMember', back_populates='group')
+    
+    def to_dict(self, viewer_id=None):
+        # Webhook URL は投稿用の秘密なので、設定済みかどうかだけを返す。
+        # 通知先を設定できるのは作成者だけなので、見ているユーザーが作成者かも返す
+        return {
+            'id': self.id,
+            'name': self.name,
+            'invite_code': self.invite_code,
+            'has_webhook': bool(self.webhook_url),
+            'is_owner': viewer_id is not None and self.created_by == viewer_id,
+            'created_at': self.created_at.isoformat()
+        }
 
 
 class GroupMember(db.Model):
@@ -150,6 +302,70 @@ class Badge(db.Model):
     unlocked_at = db.Column(db.DateTime, default=datetime.now)
     
     user = db.relationship('User', back_populates='badges')
+    
+    def to_dict(self):
+        return {
+            'name': self.badge_name,
+            'icon': self.badge_icon,
+            'unlocked_at': self.unlocked_at.isoformat()
+        }
+
+
+class PunishmentNotice(db.Model):
+    # 処刑1件 x 通知先1つ。webhook_digest ジョブが通知先ごとにまとめて投稿し、sent_at を埋める
+    __tablename__ = 'punishment_notices'
+    __table_args__ = (
+        db.UniqueConstraint('task_id', 'destination', name='uq_punishment_notices_task_destination'),
+        db.Index('ix_punishment_notices_pending', 'destination', 'sent_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, nullable=False)
+    # 'global'（DISCORD_WEBHOOK_URL）または 'group:<id>'
+    destination = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    sent_at = db.Column(db.DateTime)
+    # 投稿中のジョブが確保した印。同じ通知先のジョブが並んで動いても、同じ通知を二重に投稿しない
+    claimed_by = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_ready', 'status', 'priority', 'run_at'),
+        db.Index('ix_jobs_user_status', 'user_id', 'status'),
+        db.Index('ix_jobs_status_finished', 'status', 'finished_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    priority = db.Column(db.Integer, nullable=False, default=100)  # 小さいほど先に実行
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued / running / done
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    idempotency_key = db.Column(db.String(200), unique=True)
+    user_id = db.Column(db.Integer)  # 結果を待っているユーザー（いれば）
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    finished_at = db.Column(db.DateTime)
+
+
+class DeadJob(db.Model):
+    __tablename__ = 'dead_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    idempotency_key = db.Column(db.String(200))
+    attempts = db.Column(db.Integer)
+    last_error = db.Column(db.Text)
+    failed_at = db.Column(db.DateTime, default=datetime.now)
 
 
 # --- ヘルパー関数 ---
@@ -172,6 +388,16 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def admin_required(f):
+    @wraps(f)
+    @login_required
+    def decorated_function(*args, **kwargs):
+        user = get_current_user()
+        if user.username not in app.config['ADMIN_USERNAMES']:
+            return jsonify({'error': 'Forbidden'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
 def get_current_user():
     if 'user_id' not in session:
         return None
@@ -185,25 +411,41 @@ def get_user_stats(user_id):
         db.session.commit()
     return stats
 
+def invalidate_user_cache(user_id):
+    # 統計が変わるとランキング（全体・グループ）も変わる
+    cache.invalidate_tags(f'user:{user_id}', 'rankings')
+
+def bump_data_revision(*user_ids):
+    # 呼び出し側のコミットで確定する。別プロセスの更新と競合しないよう UPDATE 文で加算する
+    User.query.filter(User.id.in_(user_ids)).update(
+        {User.data_revision: User.data_revision + 1}, synchronize_session=False
+    )
+
 def update_user_stats(user_id):
-    try:
-        stats = get_user_stats(user_id)
-        all_tasks = Task.query.filter_by(user_id=user_id).all()
-        
-        stats.total_tasks = len(all_tasks)
-        stats.completed_tasks = len([t for t in all_tasks if t.is_completed])
-        stats.punished_tasks = len([t for t in all_tasks if t.is_punished])
-        stats.laziness_score = stats.calculate_laziness_score()
-        stats.last_activity = datetime.now()
-        
-        db.session.commit()
-        user = User.query.get(user_id)
-        check_and_unlock_badges(user, stats)
-        return stats
-    except Exception as e:
-        print(f"統計更新エラー: {e}")
-        db.session.rollback()
-        return get_user_stats(user_id)
+    # user_stats ジョブから呼ばれる。失敗はジョブのリトライとデッドレターに任せるので、ここでは捕まえない
+    stats = get_user_stats(user_id)
+    # アーカイブ済みの件数と同じスナップショットで数えるよう、1つの SELECT にまとめる
+    counts = db.session.query(
+        func.count(Task.id),
+        func.coalesce(func.sum(case((Task.is_completed == True, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Task.is_punished == True, 1), else_=0)), 0),
+        UserStats.archived_tasks, UserStats.archived_completed, UserStats.archived_punished
+    ).select_from(UserStats).outerjoin(
+        Task, Task.user_id == UserStats.user_id
+    ).filter(UserStats.id == stats.id).group_by(UserStats.id).one()
+
+    stats.total_tasks = counts[0] + counts[3]
+    stats.completed_tasks = counts[1] + counts[4]
+    stats.punished_tasks = counts[2] + counts[5]
+    stats.laziness_score = stats.calculate_laziness_score()
+    stats.last_activity = datetime.now()
+    bump_data_revision(user_id)
+
+    db.session.commit()
+    invalidate_user_cache(user_id)
+    user = User.query.get(user_id)
+    check_and_unlock_badges(user, stats)
+    return stats
 
 def check_and_unlock_badges(user, stats):
     if not user:
@@ -231,11 +473,311 @@ def check_and_unlock_badges(user, stats):
             badge_icon=badge_icon
         )
         db.session.add(badge)
-        flash(f"🎖️ バッジ解除: {badge_icon} {badge_name}", 'success')
+        # 統計の再計算はワーカーで動くので flash はできない。解除の通知は get_recent_badges でダッシュボードに載せる
     
     if badges_to_unlock:
+        bump_data_revision(user.id)
         db.session.commit()
 
+# --- API レスポンス ---
+
+# 一覧系 API は ORM オブジェクトを作らず、必要な列だけをタプルで取得する
+TASK_COLUMNS = (
+    Task.id, Task.title, Task.deadline, Task.penalty_text,
+    Task.is_punished, Task.is_completed, Task.created_at
+)
+
+# 履歴は tasks と tasks_archive の両方から同じ列を読む
+HISTORY_COLUMNS = (
+    'id', 'title', 'deadline', 'penalty_text', 'is_punished', 'is_completed',
+    'created_at', 'completed_at', 'punished_at'
+)
+
+RANKING_COLUMNS = (
+    User.display_name, User.username, UserStats.laziness_score,
+    UserStats.completed_tasks, UserStats.punished_tasks
+)
+
+def serialize_task_rows(rows):
+    return [{
+        'id': row.id,
+        'title': row.title,
+        'deadline': row.deadline.isoformat() if row.deadline else None,
+        'penalty_text': row.penalty_text,
+        'is_punished': row.is_punished,
+        'is_completed': row.is_completed,
+        'created_at': row.created_at.isoformat()
+    } for row in rows]
+
+def serialize_ranking_rows(rows):
+    return [{
+        'rank': i + 1,
+        'username': row.display_name or row.username,
+        'laziness_score': row.laziness_score,
+        'completed_tasks': row.completed_tasks,
+        'punished_tasks': row.punished_tasks
+    } for i, row in enumerate(rows)]
+
+def get_history_rows(model, user_id, before, limit):
+    query = db.session.query(*[getattr(model, name) for name in HISTORY_COLUMNS]).filter(
+        model.user_id == user_id,
+        or_(model.is_completed == True, model.is_punished == True)
+    )
+    if before:
+        query = query.filter(model.id < before)
+    return query.order_by(model.id.desc()).limit(limit).all()
+
+def serialize_history_rows(rows):
+    history = serialize_task_rows(rows)
+    for item, row in zip(history, rows):
+        item['completed_at'] = row.completed_at.isoformat() if row.completed_at else None
+        item['punished_at'] = row.punished_at.isoformat() if row.punished_at else None
+    return history
+
+def get_pending_task_rows(user_id):
+    return Task.query.with_entities(*TASK_COLUMNS).filter_by(
+        user_id=user_id, is_completed=False
+    ).order_by(Task.created_at.desc()).all()
+
+def load_global_rankings():
+    rows = db.session.query(*RANKING_COLUMNS).join(
+        User, User.id == UserStats.user_id
+    ).order_by(UserStats.laziness_score.desc(), UserStats.id).all()
+    return serialize_ranking_rows(rows)
+
+def load_group_rankings(group_id):
+    # グループが存在しなければ None
+    if not Group.query.get(group_id):
+        return None
+    rows = db.session.query(*RANKING_COLUMNS).select_from(GroupMember).join(
+        User, User.id == GroupMember.user_id
+    ).join(
+        UserStats, UserStats.user_id == GroupMember.user_id
+    ).filter(
+        GroupMember.group_id == group_id
+    ).order_by(UserStats.laziness_score.desc(), GroupMember.id).all()
+    return serialize_ranking_rows(rows)
+
+def find_group_by_invite_code(invite_code):
+    # (id, name) を返す。キャッシュできるよう ORM オブジェクトではなくタプルにする
+    row = Group.query.with_entities(Group.id, Group.name).filter_by(invite_code=invite_code).first()
+    return (row.id, row.name) if row else None
+
+def get_user_groups(user_id):
+    return Group.query.join(GroupMember, GroupMember.group_id == Group.id).filter(
+        GroupMember.user_id == user_id
+    ).order_by(GroupMember.id).all()
+
+def encode_json(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def choose_encoding():
+    # Accept-Encoding の q 値が 0 のものは使わない
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def json_response(payload, status=200):
+    body = encode_json(payload)
+    response = make_response(body, status)
+    response.mimetype = 'application/json'
+    response.vary.add('Accept-Encoding')
+
+    if len(body) >= app.config['API_COMPRESS_MIN_BYTES']:
+        encoding = choose_encoding()
+        if encoding == 'br':
+            response.set_data(brotli.compress(body, quality=4))
+        elif encoding == 'gzip':
+            response.set_data(gzip.compress(body, compresslevel=5))
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    return response
+
+# --- 静的ファイル ---
+#
+# build_assets.py が static/dist/ に書き出した、内容ハッシュ付きのファイルを配信する。
+# 本番では nginx.conf のとおり nginx が直接返すので、ここは nginx を置かない場合の代替。
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+def load_asset_manifest():
+    if not app.config['STATIC_FINGERPRINT']:
+        return {}
+    path = os.path.join(app.static_folder, 'dist', 'manifest.json')
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        built_at = os.path.getmtime(path)
+        # 書き出した後に元のファイルを編集していたら、古い dist/ を配信しないようマニフェストを使わない
+        stale = [name for name in manifest if os.path.getmtime(os.path.join(app.static_folder, name)) > built_at]
+    except (OSError, ValueError):
+        return {}
+    if stale:
+        print(f"⚠️ {', '.join(stale)} は build_assets.py の実行後に変更されています。元のファイルを配信します")
+        return {}
+    return manifest
+
+ASSET_MANIFEST = load_asset_manifest()
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    # url_for('static', filename='style.css') -> /static/dist/style.<hash>.css
+    if endpoint == 'static':
+        hashed = ASSET_MANIFEST.get(values.get('filename'))
+        if hashed:
+            values['filename'] = hashed
+
+def send_static_asset(filename):
+    if not filename.startswith('dist/'):
+        return app.send_static_file(filename)
+
+    # ブラウザが受け付ける圧縮済みのファイルがあれば、圧縮せずにそのまま返す
+    accepted = request.accept_encodings
+    mimetype = mimetypes.guess_type(filename)[0]
+    response = None
+    for encoding, suffix in PRECOMPRESSED:
+        if accepted[encoding] and os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+            response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(app.static_folder, filename, mimetype=mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+app.view_functions['static'] = send_static_asset
+
+# --- ポーリング間隔 ---
+
+def with_poll_interval(response, seconds):
+    response.headers['X-Poll-Interval'] = str(int(math.ceil(seconds)))
+    return response
+
+def recommend_punishment_poll(user_id):
+    # 次の期限まで待てばよく、期限を過ぎて処刑待ちの間と未確認の処刑がある間は短い間隔で確認する
+    low, high = app.config['POLL_MIN_SECONDS'], app.config['POLL_MAX_SECONDS']
+    seq, ack_seq = db.session.query(User.punish_seq, User.punish_ack_seq).filter(User.id == user_id).one()
+    if (seq or 0) > (ack_seq or 0):
+        return low
+    nearest = db.session.query(func.min(Task.deadline)).filter(
+        Task.user_id == user_id,
+        Task.is_completed == False,
+        Task.is_punished == False,
+        Task.deadline != None
+    ).scalar()
+    if nearest is None:
+        return high
+    remaining = (nearest - datetime.now()).total_seconds()
+    if remaining <= 0:
+        # スケジューラが遅れていても、処刑されたらすぐポップアップを出せるようにする
+        return low
+    return max(low, min(high, remaining))
+
+def recommend_dashboard_poll(user_id):
+    # 統計の再計算や褒め言葉の生成を待っている間だけ短くする
+    pending = Job.query.with_entities(Job.id).filter(
+        Job.user_id == user_id,
+        Job.status.in_(('queued', 'running'))
+    ).first()
+    if pending:
+        return app.config['POLL_MIN_SECONDS']
+    return app.config['DASHBOARD_POLL_SECONDS']
+
+def get_user_rank(stats):
+    # /api/rankings と同じ並び（怠惰度の降順、同点は先に登録した順）での順位
+    ahead = db.session.query(func.count(UserStats.id)).join(
+        User, User.id == UserStats.user_id
+    ).filter(
+        or_(
+            UserStats.laziness_score > stats.laziness_score,
+            and_(UserStats.laziness_score == stats.laziness_score, UserStats.id < stats.id)
+        )
+    ).scalar()
+    return ahead + 1
+
+def get_recent_praises(user_id):
+    # ワーカーが生成した直近の褒め言葉（クライアント側で一度だけ表示する）
+    praises = Task.query.with_entities(Task.id, Task.title, Task.praise_text).filter(
+        Task.user_id == user_id,
+        Task.is_completed == True,
+        Task.praise_text != None,
+        Task.completed_at >= datetime.now() - timedelta(minutes=10)
+    ).all()
+    return [{'id': p.id, 'title': p.title, 'message': p.praise_text} for p in praises]
+
+def get_recent_badges(user_id):
+    # ワーカーが解除した直近のバッジ（褒め言葉と同じくクライアント側で一度だけ表示する）
+    badges = Badge.query.with_entities(Badge.id, Badge.badge_name, Badge.badge_icon).filter(
+        Badge.user_id == user_id,
+        Badge.unlocked_at >= datetime.now() - timedelta(minutes=10)
+    ).all()
+    return [{'id': b.id, 'message': f"🎖️ バッジ解除: {b.badge_icon} {b.badge_name}"} for b in badges]
+
+def build_dashboard(user):
+    # ダッシュボード表示に必要なデータを固定回数のクエリでまとめて取得
+    tasks = get_pending_task_rows(user.id)
+    stats = get_user_stats(user.id)
+    badges = Badge.query.filter_by(user_id=user.id).all()
+    groups = get_user_groups(user.id)
+
+    return {
+        'tasks': serialize_task_rows(tasks),
+        'stats': stats.to_dict(),
+        'badges': [b.to_dict() for b in badges],
+        'groups': [g.to_dict(user.id) for g in groups],
+        'praises': get_recent_praises(user.id),
+        'unlocked_badges': get_recent_badges(user.id),
+        'rank': get_user_rank(stats)
+    }
+
+# --- 画面の断片キャッシュ ---
+#
+# 統計・バッジ・グループのパネルは、ユーザーと data_revision をキーに HTML とデータを組で保存する。
+# 版数はデータと同じトランザクションで上がるので、無効化を待たずに別プロセスでも古い断片を使わない。
+# テンプレートのマークアップを変えたら FRAGMENT_MARKUP_VERSION を上げ、共有キャッシュに残る古い HTML を使わない。
+
+FRAGMENT_MARKUP_VERSION = 3
+
+FRAGMENT_LOADERS = {
+    'stats': lambda user_id: get_user_stats(user_id).to_dict(),
+    'badges': lambda user_id: [b.to_dict() for b in Badge.query.filter_by(user_id=user_id).all()],
+    'groups': lambda user_id: [g.to_dict(user_id) for g in get_user_groups(user_id)],
+}
+
+def render_fragment(template, name, user):
+    """fragments/<template>.html を描画し、(HTML, 元データ) を返す"""
+    def build():
+        data = FRAGMENT_LOADERS[name](user.id)
+        return {'html': render_template(f'fragments/{template}.html', **{name: data}), 'data': data}
+
+    ttl = app.config['FRAGMENT_CACHE_TTL']
+    if ttl <= 0:
+        fragment = build()
+    else:
+        key = f'fragment:v{FRAGMENT_MARKUP_VERSION}:{template}:{user.id}:{user.data_revision or 0}'
+        fragment = cache.get_or_set(key, build, ttl=ttl)
+    return Markup(fragment['html']), fragment['data']
+
+def get_cached_rank(user_id):
+    # 順位は他のユーザーの統計でも変わるので、版数ではなくランキングのタグで失効させる
+    return cache.get_or_set(
+        f'rank:{user_id}', lambda: get_user_rank(get_user_stats(user_id)),
+        ttl=15, tags=('rankings',)
+    )
+
+@app.template_filter('ja_date')
+def ja_date(value):
+    # script.js の toLocaleDateString('ja-JP') と同じ表記（例: 2024/4/1）
+    d = datetime.fromisoformat(value) if isinstance(value, str) else value
+    return f'{d.year}/{d.month}/{d.day}'
+
 def generate_invite_code():
     while True:
         code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
@@ -263,9 +805,15 @@ def generate_praise_with_ai(task_title):
         print(f"Google AI APIエラー: {e}")
         return generate_backup_praise_message()
 
-def send_discord_punishment(task_title, penalty_text):
+def get_discord_webhook_url():
     webhook_url = os.getenv("DISCORD_WEBHOOK_URL")
     if not webhook_url or webhook_url == "https://discordapp.com/api/webhooks/dummy/dummy":
+        return None
+    return webhook_url
+
+def send_discord_punishment(task_title, penalty_text):
+    webhook_url = get_discord_webhook_url()
+    if not webhook_url:
         return False
 
     data = {
@@ -287,34 +835,528 @@ def send_discord_punishment(task_title, penalty_text):
         print(f"Discord通信エラー: {e}")
         return False
 
+# Discord の1メッセージの上限（埋め込み10個、1つの埋め込みにフィールド25個、本文合計6000文字）
+DISCORD_MAX_EMBEDS = 10
+DISCORD_MAX_FIELDS = 25
+DISCORD_MAX_CHARS = 5000  # 埋め込みのタイトルなどの分を残しておく
+
+def resolve_webhook_url(destination):
+    if destination == 'global':
+        return get_discord_webhook_url()
+    group = Group.query.get(int(destination.split(':', 1)[1]))
+    return group.webhook_url if group else None
+
+def punishment_embed(fields):
+    return {
+        "title": f"☠️ 社会的制裁が執行されました（{len(fields)}件）",
+        "color": 15158332,
+        "fields": fields
+    }
+
+def build_punishment_digests(rows):
+    """処刑の一覧を Discord の上限に収まるメッセージに分け、(含めた行, 投稿内容) を順に返す"""
+    message_rows, embeds, fields, chars = [], [], [], 0
+    for row in rows:
+        field = {
+            "name": f"{row.display_name or row.username}「{row.title}」"[:256],
+            "value": f"**{row.penalty_text or '（罰の内容なし）'}**"[:1024],
+            "inline": False
+        }
+        size = len(field["name"]) + len(field["value"])
+        message_full = len(embeds) == DISCORD_MAX_EMBEDS - 1 and len(fields) == DISCORD_MAX_FIELDS
+        if message_rows and (chars + size > DISCORD_MAX_CHARS or message_full):
+            yield message_rows, {"username": "Social Guillotine 執行人", "embeds": embeds + [punishment_embed(fields)]}
+            message_rows, embeds, fields, chars = [], [], [], 0
+        elif len(fields) == DISCORD_MAX_FIELDS:
+            embeds.append(punishment_embed(fields))
+            fields = []
+        fields.append(field)
+        message_rows.append(row)
+        chars += size
+    if message_rows:
+        yield message_rows, {"username": "Social Guillotine 執行人", "embeds": embeds + [punishment_embed(fields)]}
+
+def discord_retry_after(response):
+    # Retry-After ヘッダ、または本文の retry_after（どちらも秒。小数のこともある）
+    try:
+        return max(0.0, float(response.headers.get('Retry-After') or response.json()['retry_after']))
+    except (KeyError, TypeError, ValueError):
+        return 5.0
+
+def post_discord_webhook(webhook_url, data):
+    response = requests.post(webhook_url, json=data, timeout=10)
+    if response.status_code == 429:
+        # レート制限は失敗として数えず、Discord が指定した時間だけ待ってやり直す
+        raise RetryLater(discord_retry_after(response), 'Discord のレート制限に達しました (HTTP 429)')
+    if response.status_code not in (200, 204):
+        raise RuntimeError(f'Discord への投稿に失敗しました (HTTP {response.status_code})')
+
 def check_deadlines():
     try:
-        with app.app_context():
+        with app.app_context(), profiler.job('check_deadlines'):
             now = datetime.now()
             expired_tasks = Task.query.filter(
                 Task.deadline < now,
                 Task.is_punished == False,
                 Task.is_completed == False
-            ).all()
+            ).order_by(Task.deadline).all()
+
+            user_ids = {task.user_id for task in expired_tasks}
+            users = {u.id: u for u in User.query.filter(User.id.in_(user_ids)).all()} if user_ids else {}
+
+            # 通知先: 全体の Webhook と、ユーザーが参加していて Webhook を登録したグループ
+            global_destinations = ['global'] if expired_tasks and get_discord_webhook_url() else []
+            group_destinations = {}
+            if user_ids:
+                memberships = db.session.query(GroupMember.user_id, GroupMember.group_id).join(
+                    Group, Group.id == GroupMember.group_id
+                ).filter(GroupMember.user_id.in_(user_ids), Group.webhook_url != None)
+                for member_id, group_id in memberships:
+                    group_destinations.setdefault(member_id, []).append(f'group:{group_id}')
+            destinations = set()
 
             for task in expired_tasks:
                 task.is_punished = True
-                send_discord_punishment(task.title, task.penalty_text)
+                task.punished_at = now
+                # ユーザーごとの単調増加する通番。/check_punishments はこの値をカーソルにする
+                user = users.get(task.user_id)
+                if user:
+                    user.punish_seq = (user.punish_seq or 0) + 1
+                    task.punish_seq = user.punish_seq
+                for destination in global_destinations + group_destinations.get(task.user_id, []):
+                    db.session.add(PunishmentNotice(task_id=task.id, destination=destination))
+                    destinations.add(destination)
+
+            # 投稿は通知先ごとに1つのジョブにまとめる。待機中のジョブがあればそれに相乗りするので、
+            # 最初の処刑から WEBHOOK_DIGEST_WINDOW 秒の間の処刑は1回の投稿（ダイジェスト）になる
+            run_at = now + timedelta(seconds=app.config['WEBHOOK_DIGEST_WINDOW'])
+            for destination in sorted(destinations):
+                enqueue_job('webhook_digest', {'destination': destination}, priority=10, coalesce=True, run_at=run_at)
 
             if expired_tasks:
-                db.session.commit()
+                punished_counts = {}
                 for task in expired_tasks:
-                    stats = UserStats.query.filter_by(user_id=task.user_id).first()
-                    if stats:
-                        stats.laziness_score = stats.calculate_laziness_score()
+                    punished_counts[task.user_id] = punished_counts.get(task.user_id, 0) + 1
+                # index で毎回 update_user_stats を走らせなくて済むよう、処刑数をここで反映する。
+                # 処刑と同じトランザクションで UPDATE 文により加算するので、統計ジョブの再集計と
+                # 入れ違っても二重に数えない
+                for user_id, count in punished_counts.items():
+                    punished = func.coalesce(UserStats.punished_tasks, 0) + count
+                    UserStats.query.filter_by(user_id=user_id).update({
+                        UserStats.punished_tasks: punished,
+                        UserStats.laziness_score: case(
+                            (UserStats.total_tasks > 0, case(
+                                (punished >= UserStats.total_tasks, 100.0),
+                                else_=punished * 100.0 / UserStats.total_tasks
+                            )),
+                            else_=0.0
+                        )
+                    }, synchronize_session=False)
+                    bump_data_revision(user_id)
                 db.session.commit()
+                for user_id in punished_counts:
+                    invalidate_user_cache(user_id)
     except Exception as e:
         print(f"check_deadlines エラー: {e}")
         db.session.rollback()
 
+# --- アーカイブ ---
+#
+# tasks には未完了のタスクと最近のものだけを残し、締め切りチェックや一覧の走査を小さく保つ。
+# 1バッチごとに「アーカイブへの挿入・件数の加算・削除」を1トランザクションで行うので、
+# 途中で止まっても統計はずれない。
+
+ARCHIVE_COLUMNS = [column.name for column in Task.__table__.columns]
+
+def archive_finalized_tasks(max_batches=None):
+    moved = 0
+    with app.app_context(), profiler.job('archive_finalized_tasks'):
+        try:
+            cutoff = datetime.now() - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])
+            finalized_at = func.coalesce(Task.completed_at, Task.punished_at, Task.deadline, Task.created_at)
+            last_id = 0
+            batches = 0
+            while max_batches is None or batches < max_batches:
+                # 主キー順に前へ進むので、全体の走査はテーブル1周分で済む
+                rows = Task.query.with_entities(
+                    Task.id, Task.user_id, Task.is_completed, Task.is_punished
+                ).filter(
+                    Task.id > last_id,
+                    or_(Task.is_completed == True, Task.is_punished == True),
+                    finalized_at < cutoff
+                ).order_by(Task.id).limit(app.config['ARCHIVE_BATCH_SIZE']).all()
+                if not rows:
+                    break
+                ids = [row.id for row in rows]
+                last_id = ids[-1]
+
+                db.session.execute(ArchivedTask.__table__.insert().from_select(
+                    ARCHIVE_COLUMNS,
+                    select(*[Task.__table__.c[name] for name in ARCHIVE_COLUMNS]).where(Task.id.in_(ids))
+                ))
+
+                counts = {}
+                for row in rows:
+                    total, completed, punished = counts.get(row.user_id, (0, 0, 0))
+                    counts[row.user_id] = (total + 1, completed + bool(row.is_completed), punished + bool(row.is_punished))
+                for user_id, (total, completed, punished) in counts.items():
+                    updated = UserStats.query.filter_by(user_id=user_id).update({
+                        UserStats.archived_tasks: UserStats.archived_tasks + total,
+                        UserStats.archived_completed: UserStats.archived_completed + completed,
+                        UserStats.archived_punished: UserStats.archived_punished + punished
+                    }, synchronize_session=False)
+                    if not updated:
+                        db.session.add(UserStats(user_id=user_id, archived_tasks=total,
+                                                 archived_completed=completed, archived_punished=punished))
+
+                Task.query.filter(Task.id.in_(ids)).delete(synchronize_session=False)
+                db.session.commit()
+                moved += len(ids)
+                batches += 1
+                # バッチの間に他の書き込み（締め切りチェックやリクエスト）へ SQLite のロックを譲る
+                time.sleep(app.config['ARCHIVE_BATCH_PAUSE'])
+
+            if moved:
+                print(f"🗄️ タスクを {moved} 件アーカイブしました")
+        except Exception as e:
+            print(f"アーカイブエラー: {e}")
+            db.session.rollback()
+    return moved
+
+# --- ジョブキュー ---
+#
+# 遅い副作用（Discord 通知、AI の褒め言葉、統計の再計算）は jobs テーブルに積み、
+# ワーカースレッド（python worker.py、または python app.py 内蔵）が実行する。
+# enqueue_job はコミットしないので、呼び出し側の変更と同じトランザクションで確定する。
+
+JOB_HANDLERS = {}
+# 上限まで失敗してデッドレターに移したときの後始末（同じトランザクションで実行する）
+JOB_DEAD_HANDLERS = {}
+
+class RetryLater(Exception):
+    """ハンドラが送出すると、試行回数を増やさずに delay 秒後にやり直す（レート制限など）"""
+
+    def __init__(self, delay, message):
+        super().__init__(message)
+        self.delay = delay
+
+def job_handler(kind, on_dead=None):
+    def register(f):
+        JOB_HANDLERS[kind] = f
+        if on_dead:
+            JOB_DEAD_HANDLERS[kind] = on_dead
+        return f
+    return register
+
+def enqueue_job(kind, payload, priority=100, idempotency_key=None, coalesce=False, max_attempts=5, user_id=None,
+                run_at=None):
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    # 同じキーのジョブは状態にかかわらず一度しか積まない
+    if idempotency_key:
+        existing = Job.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing
+    # coalesce=True なら、未実行の同一ジョブがあればそれにまとめる
+    if coalesce:
+        existing = Job.query.filter_by(kind=kind, payload=encoded, status='queued').first()
+        if existing:
+            return existing
+
+    job = Job(
+        kind=kind,
+        payload=encoded,
+        priority=priority,
+        idempotency_key=idempotency_key,
+        max_attempts=max_attempts,
+        user_id=user_id,
+        run_at=run_at or datetime.now()
+    )
+    if not idempotency_key:
+        db.session.add(job)
+        return job
+    # 確認の後に別のリクエストが同じキーで積むことがあるので、一意制約の違反はセーブポイントだけ戻し、
+    # 呼び出し側の変更（タスクの完了など）は残したまま既存のジョブを返す
+    try:
+        with db.session.begin_nested():
+            db.session.add(job)
+    except IntegrityError:
+        return Job.query.filter_by(idempotency_key=idempotency_key).one()
+    return job
+
+def enqueue_stats_update(user_id):
+    enqueue_job('user_stats', {'user_id': user_id}, priority=50, coalesce=True, user_id=user_id)
+
+def requeue_stale_jobs():
+    # ワーカーが落ちて running のまま残ったジョブを戻す
+    cutoff = datetime.now() - timedelta(seconds=app.config['JOB_LOCK_TIMEOUT'])
+    count = Job.query.filter(Job.status == 'running', Job.locked_at < cutoff).update(
+        {'status': 'queued', 'locked_by': None, 'locked_at': None}, synchronize_session=False
+    )
+    db.session.commit()
+    return count
+
+def prune_finished_jobs():
+    # done のジョブは残しても使わないので、tasks のアーカイブと同じくバッチに分けて消す。
+    # idempotency_key も一緒に消えるが、キーを使う praise はハンドラ側でも二重に書かない
+    deleted = 0
+    with app.app_context():
+        try:
+            cutoff = datetime.now() - timedelta(hours=app.config['JOB_RETENTION_HOURS'])
+            while True:
+                ids = [row.id for row in Job.query.with_entities(Job.id).filter(
+                    Job.status == 'done', Job.finished_at < cutoff
+                ).limit(app.config['ARCHIVE_BATCH_SIZE'])]
+                if not ids:
+                    break
+                Job.query.filter(Job.id.in_(ids), Job.status == 'done').delete(synchronize_session=False)
+                db.session.commit()
+                deleted += len(ids)
+                time.sleep(app.config['ARCHIVE_BATCH_PAUSE'])
+            if deleted:
+                print(f"🧹 完了したジョブを {deleted} 件削除しました")
+        except Exception as e:
+            print(f"ジョブ削除エラー: {e}")
+            db.session.rollback()
+    return deleted
+
+def claim_job(worker_id):
+    # SQLite には SKIP LOCKED が無いので、status を条件にした UPDATE で取り合う
+    for _ in range(5):
+        now = datetime.now()
+        candidate = Job.query.with_entities(Job.id).filter(
+            Job.status == 'queued', Job.run_at <= now
+        ).order_by(Job.priority, Job.run_at, Job.id).first()
+        if not candidate:
+            return None
+        claimed = Job.query.filter_by(id=candidate.id, status='queued').update({
+            'status': 'running',
+            'locked_by': worker_id,
+            'locked_at': now,
+            'attempts': Job.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed == 1:
+            return Job.query.get(candidate.id)
+    return None
+
+def run_job(job):
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f'未登録のジョブ種別です: {job.kind}')
+        handler(json.loads(job.payload))
+        job.status = 'done'
+        job.finished_at = datetime.now()
+        job.locked_by = None
+        job.last_error = None
+        db.session.commit()
+        return True
+    except RetryLater as e:
+        db.session.rollback()
+        print(f"ジョブ再実行待ち ({job.kind} #{job.id}): {e}（{e.delay:.1f}秒後）")
+        job = Job.query.get(job.id)
+        job.status = 'queued'
+        job.locked_by = None
+        job.locked_at = None
+        # claim_job で数えた分を戻し、待たされただけのジョブをデッドレターに送らない
+        job.attempts = max(0, job.attempts - 1)
+        job.last_error = str(e)
+        job.run_at = datetime.now() + timedelta(seconds=e.delay)
+        db.session.commit()
+        return False
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc(limit=5)
+        print(f"ジョブ実行エラー ({job.kind} #{job.id}): {error.strip().splitlines()[-1]}")
+        job = Job.query.get(job.id)
+        if job.attempts >= job.max_attempts:
+            # 上限まで失敗したものはデッドレターに移す
+            db.session.add(DeadJob(
+                job_id=job.id,
+                kind=job.kind,
+                payload=job.payload,
+                idempotency_key=job.idempotency_key,
+                attempts=job.attempts,
+                last_error=error
+            ))
+            db.session.delete(job)
+            on_dead = JOB_DEAD_HANDLERS.get(job.kind)
+            if on_dead:
+                on_dead(json.loads(job.payload))
+        else:
+            job.status = 'queued'
+            job.locked_by = None
+            job.locked_at = None
+            job.last_error = error
+            job.run_at = datetime.now() + timedelta(seconds=min(2 ** job.attempts, 300))
+        db.session.commit()
+        return False
+
+def work_jobs(stop_event, worker_id=None):
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+    last_requeue = 0.0
+    while not stop_event.is_set():
+        try:
+            with app.app_context():
+                if time.monotonic() - last_requeue > 60:
+                    requeue_stale_jobs()
+                    last_requeue = time.monotonic()
+                job = claim_job(worker_id)
+                if job:
+                    run_job(job)
+                    continue
+        except Exception as e:
+            print(f"ワーカーエラー: {e}")
+        stop_event.wait(app.config['JOB_POLL_INTERVAL'])
+
+def start_job_workers(count, stop_event):
+    threads = []
+    for i in range(count):
+        thread = threading.Thread(target=work_jobs, args=(stop_event,), name=f'job-worker-{i}', daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+def requeue_webhook_digest(payload):
+    # 上限まで失敗しても未送信の通知が残っていれば、バックオフの上限だけ空けて次のジョブに引き継ぐ。
+    # 次の処刑を待たずに、通知先が復旧すれば必ず届く
+    pending = PunishmentNotice.query.with_entities(PunishmentNotice.id).filter(
+        PunishmentNotice.destination == payload['destination'],
+        PunishmentNotice.sent_at == None
+    ).first()
+    if pending:
+        enqueue_job('webhook_digest', payload, priority=10, coalesce=True,
+                    run_at=datetime.now() + timedelta(seconds=300))
+
+@job_handler('webhook_digest', on_dead=requeue_webhook_digest)
+def handle_webhook_digest(payload):
+    destination = payload['destination']
+    # 未送信の通知を条件付き UPDATE で確保する。前のジョブが投稿中なら、その分は取らない。
+    # 確保したまま落ちたものは JOB_LOCK_TIMEOUT 後に取り直せる
+    claim = uuid.uuid4().hex
+    stale = datetime.now() - timedelta(seconds=app.config['JOB_LOCK_TIMEOUT'])
+    PunishmentNotice.query.filter(
+        PunishmentNotice.destination == destination,
+        PunishmentNotice.sent_at == None,
+        or_(PunishmentNotice.claimed_by == None, PunishmentNotice.claimed_at < stale)
+    ).update({'claimed_by': claim, 'claimed_at': datetime.now()}, synchronize_session=False)
+    db.session.commit()
+
+    try:
+        pending = db.session.query(
+            PunishmentNotice.id, Task.title, Task.penalty_text, User.display_name, User.username
+        ).outerjoin(Task, Task.id == PunishmentNotice.task_id).outerjoin(User, User.id == Task.user_id).filter(
+            PunishmentNotice.claimed_by == claim,
+            PunishmentNotice.sent_at == None
+        ).order_by(PunishmentNotice.id).all()
+
+        webhook_url = resolve_webhook_url(destination)
+        # 通知先が消えた・タスクが消えたものは投稿せずに済んだ扱いにする
+        skipped = [row.id for row in pending if not webhook_url or row.title is None]
+        if skipped:
+            PunishmentNotice.query.filter(PunishmentNotice.id.in_(skipped)).update(
+                {'sent_at': datetime.now()}, synchronize_session=False
+            )
+            db.session.commit()
+        if not webhook_url:
+            return
+
+        rows = [row for row in pending if row.title is not None]
+        for message_rows, data in build_punishment_digests(rows):
+            post_discord_webhook(webhook_url, data)
+            # 1通ごとに確定し、途中で失敗してもリトライで同じ処刑を二重に投稿しない。
+            # 残りの確保も延長し、投稿に時間がかかっても他のジョブに取り直されないようにする
+            now = datetime.now()
+            PunishmentNotice.query.filter(PunishmentNotice.id.in_([row.id for row in message_rows])).update(
+                {'sent_at': now}, synchronize_session=False
+            )
+            PunishmentNotice.query.filter(
+                PunishmentNotice.claimed_by == claim, PunishmentNotice.sent_at == None
+            ).update({'claimed_at': now}, synchronize_session=False)
+            db.session.commit()
+    except Exception:
+        # 投稿できなかった分を手放し、リトライや同じ通知先の次のジョブが拾えるようにする
+        db.session.rollback()
+        PunishmentNotice.query.filter(
+            PunishmentNotice.claimed_by == claim, PunishmentNotice.sent_at == None
+        ).update({'claimed_by': None, 'claimed_at': None}, synchronize_session=False)
+        db.session.commit()
+        raise
+
+# 以前のバージョンが処刑1件ごとに積んだジョブ用
+@job_handler('discord_punishment')
+def handle_discord_punishment(payload):
+    if not get_discord_webhook_url():
+        return
+    if not send_discord_punishment(payload['title'], payload['penalty_text']):
+        raise RuntimeError('Discord への投稿に失敗しました')
+
+@job_handler('praise')
+def handle_praise(payload):
+    task = Task.query.with_entities(Task.title, Task.praise_text).filter_by(id=payload['task_id']).first()
+    if task and not task.praise_text:
+        praise_text = generate_praise_with_ai(task.title)
+        # 生成を待つ間にアーカイブへ移ったタスクは、UPDATE が0行になるだけで失敗にしない
+        Task.query.filter(Task.id == payload['task_id'], Task.praise_text == None).update(
+            {'praise_text': praise_text}, synchronize_session=False
+        )
+        db.session.commit()
+
+@job_handler('user_stats')
+def handle_user_stats(payload):
+    update_user_stats(payload['user_id'])
+
+def rebuild_tasks_with_autoincrement(conn):
+    # AUTOINCREMENT の無い古い tasks は、アーカイブで消えた最大の id を使い回してしまう。
+    # SQLite は後から付けられないので、テーブルを作り直す（インデックスは upgrade_schema が作り直す）
+    if conn.dialect.name != 'sqlite':
+        return
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tasks'")).scalar()
+    if not ddl or 'AUTOINCREMENT' in ddl.upper():
+        return
+    columns = ', '.join(ARCHIVE_COLUMNS)
+    conn.execute(text('ALTER TABLE tasks RENAME TO tasks_old'))
+    conn.execute(CreateTable(Task.__table__))
+    conn.execute(text(f'INSERT INTO tasks ({columns}) SELECT {columns} FROM tasks_old'))
+    conn.execute(text('DROP TABLE tasks_old'))
+
+    # 既に使い回された id はアーカイブと重なっていて移せないので、まだ使っていない番号に振り直す
+    top = conn.execute(text(
+        'SELECT max(coalesce((SELECT max(id) FROM tasks), 0), coalesce((SELECT max(id) FROM tasks_archive), 0))'
+    )).scalar()
+    reused = conn.execute(text('SELECT id FROM tasks WHERE id IN (SELECT id FROM tasks_archive) ORDER BY id')).scalars().all()
+    for task_id in reused:
+        top += 1
+        conn.execute(text('UPDATE tasks SET id = :new_id WHERE id = :old_id'), {'new_id': top, 'old_id': task_id})
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'tasks'"))
+    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', :seq)"), {'seq': top})
+    print(f"🔧 tasks を AUTOINCREMENT で作り直しました（振り直した id: {len(reused)} 件）")
+
+def upgrade_schema():
+    # create_all は既存テーブルを変更しないため、後から追加した列とインデックスをここで補う
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(db.engine.dialect)}'
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+                print(f"🔧 列を追加しました: {table.name}.{column.name}")
+        rebuild_tasks_with_autoincrement(conn)
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
 def init_db():
     with app.app_context():
         db.create_all()
+        upgrade_schema()
         print("✅ データベースを初期化しました")
 
 
@@ -356,6 +1398,7 @@ def register():
         stats = UserStats(user_id=new_user.id)
         db.session.add(stats)
         db.session.commit()
+        cache.invalidate_tags('rankings')
 
         session['user_id'] = new_user.id
         flash('アカウント登録完了！地獄へようこそ。', 'success')
@@ -376,14 +1419,25 @@ def logout():
 @login_required
 def index():
     user = get_current_user()
-    tasks = Task.query.filter_by(user_id=user.id, is_completed=False).order_by(Task.created_at.desc()).all()
-    stats = get_user_stats(user.id)
-    update_user_stats(user.id)
-    badges = Badge.query.filter_by(user_id=user.id).all()
-    groups = [gm.group for gm in GroupMember.query.filter_by(user_id=user.id).all()]
-    
-    tasks_dict = [t.to_dict() for t in tasks]
-    return render_template('index.html', tasks=tasks_dict, stats=stats, badges=badges, user=user, groups=groups)
+    stats_html, stats = render_fragment('stats', 'stats', user)
+    badges_html, badges = render_fragment('badges', 'badges', user)
+    groups_html, groups = render_fragment('groups', 'groups', user)
+    fragments = {'stats': stats_html, 'badges': badges_html, 'groups': groups_html}
+    # 断片の元データも埋め込み、クライアントが描画済みのパネルを描き直さないようにする
+    dashboard = {
+        'tasks': serialize_task_rows(get_pending_task_rows(user.id)),
+        'stats': stats,
+        'badges': badges,
+        'groups': groups,
+        'praises': get_recent_praises(user.id),
+        'unlocked_badges': get_recent_badges(user.id),
+        'rank': get_cached_rank(user.id)
+    }
+    poll = {
+        'punishments': recommend_punishment_poll(user.id),
+        'dashboard': recommend_dashboard_poll(user.id)
+    }
+    return render_template('index.html', user=user, dashboard=dashboard, poll=poll, fragments=fragments)
 
 @app.route('/profile', methods=['GET', 'POST'])
 @login_required
@@ -393,106 +1447,146 @@ def profile():
         user.display_name = request.form.get('display_name', '').strip()
         user.bio = request.form.get('bio', '').strip()
         db.session.commit()
+        # 表示名はランキングに出る
+        cache.invalidate_tags('rankings')
         flash('プロフィールを更新しました！', 'success')
         return redirect(url_for('profile'))
     
-    stats = get_user_stats(user.id)
-    return render_template('profile.html', user=user, stats=stats)
+    stats_html, _ = render_fragment('profile_stats', 'stats', user)
+    return render_template('profile.html', user=user, stats_html=stats_html)
+
+@app.route('/api/dashboard', methods=['GET'])
+@login_required
+def api_dashboard():
+    user = get_current_user()
+    response = json_response(build_dashboard(user))
+    return with_poll_interval(response, recommend_dashboard_poll(user.id))
 
 @app.route('/api/tasks', methods=['GET'])
 @login_required
 def api_tasks():
     user = get_current_user()
-    tasks = Task.query.filter_by(user_id=user.id, is_completed=False).order_by(Task.created_at.desc()).all()
-    return jsonify([t.to_dict() for t in tasks]), 200
+    return json_response(serialize_task_rows(get_pending_task_rows(user.id)))
+
+@app.route('/api/history', methods=['GET'])
+@login_required
+def api_history():
+    # 完了・処刑済みのタスクを新しい順に返す。archived=1 のときだけアーカイブも読む
+    user = get_current_user()
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    before = request.args.get('before', type=int)
+    rows = get_history_rows(Task, user.id, before, limit)
+    if request.args.get('archived') == '1':
+        # アーカイブに移るのは古いものなので、id の降順で両方を並べ直せばよい
+        rows = sorted(rows + get_history_rows(ArchivedTask, user.id, before, limit),
+                      key=lambda row: row.id, reverse=True)[:limit]
+    return json_response({
+        'tasks': serialize_history_rows(rows),
+        'next_before': rows[-1].id if len(rows) == limit else None
+    })
 
 @app.route('/api/stats', methods=['GET'])
 @login_required
 def api_stats():
     user = get_current_user()
-    stats = get_user_stats(user.id)
-    return jsonify(stats.to_dict()), 200
+    stats = cache.get_or_set(
+        f'stats:{user.id}', lambda: get_user_stats(user.id).to_dict(),
+        ttl=30, tags=(f'user:{user.id}',)
+    )
+    return json_response(stats)
 
 @app.route('/api/rankings', methods=['GET'])
 @login_required
 def api_rankings():
-    all_stats = UserStats.query.all()
-    rankings = []
-    for stat in sorted(all_stats, key=lambda x: x.laziness_score, reverse=True):
-        user = User.query.get(stat.user_id)
-        if user:
-            rankings.append({
-                'rank': len(rankings) + 1,
-                'username': user.display_name or user.username,
-                'laziness_score': stat.laziness_score,
-                'completed_tasks': stat.completed_tasks,
-                'punished_tasks': stat.punished_tasks
-            })
-    return jsonify(rankings), 200
+    rankings = cache.get_or_set('rankings', load_global_rankings, ttl=15, tags=('rankings',))
+    return with_poll_interval(json_response(rankings), app.config['RANKING_POLL_SECONDS'])
 
 @app.route('/api/badges', methods=['GET'])
 @login_required
 def api_badges():
     user = get_current_user()
     badges = Badge.query.filter_by(user_id=user.id).all()
-    return jsonify([{
-        'name': b.badge_name,
-        'icon': b.badge_icon,
-        'unlocked_at': b.unlocked_at.isoformat()
-    } for b in badges]), 200
+    return json_response([b.to_dict() for b in badges])
 
 @app.route('/api/groups', methods=['GET'])
 @login_required
 def api_groups():
     user = get_current_user()
-    group_members = GroupMember.query.filter_by(user_id=user.id).all()
-    groups = []
-    for gm in group_members:
-        groups.append({
-            'id': gm.group_id,
-            'name': gm.group.name,
-            'invite_code': gm.group.invite_code,
-            'created_at': gm.group.created_at.isoformat()
-        })
-    return jsonify(groups), 200
+    return json_response([g.to_dict(user.id) for g in get_user_groups(user.id)])
 
 @app.route('/api/group-rankings/<int:group_id>', methods=['GET'])
 @login_required
 def get_group_rankings(group_id):
-    group = Group.query.get(group_id)
-    if not group:
+    rankings = cache.get_or_set(
+        f'group_rankings:{group_id}', lambda: load_group_rankings(group_id),
+        ttl=15, tags=('rankings', f'group:{group_id}')
+    )
+    if rankings is None:
         return jsonify({'error': 'Group not found'}), 404
-    
-    members = GroupMember.query.filter_by(group_id=group_id).all()
-    rankings = []
-    for member in members:
-        user = User.query.get(member.user_id)
-        stats = UserStats.query.filter_by(user_id=member.user_id).first()
-        if user and stats:
-            rankings.append({
-                'username': user.display_name or user.username,
-                'laziness_score': stats.laziness_score,
-                'completed_tasks': stats.completed_tasks,
-                'punished_tasks': stats.punished_tasks
-            })
-    
-    rankings.sort(key=lambda x: x['laziness_score'], reverse=True)
-    for i, ranking in enumerate(rankings):
-        ranking['rank'] = i + 1
-    
-    return jsonify(rankings), 200
+    return json_response(rankings)
 
 @app.route('/check_punishments', methods=['GET'])
 @login_required
 def check_punishments():
     user = get_current_user()
-    recent_cutoff = datetime.now() - timedelta(seconds=15)
+    # カーソル未指定なら、最後に受信確認した位置から未確認分をすべて返す
+    since = request.args.get('since', type=int)
+    if since is None:
+        since = user.punish_ack_seq or 0
+
     punished = Task.query.filter(
         Task.user_id == user.id,
-        Task.is_punished == True,
-        Task.created_at > recent_cutoff
-    ).all()
-    return jsonify([{'id': t.id, 'title': t.title, 'penalty_text': t.penalty_text} for t in punished]), 200
+        Task.punish_seq > since
+    ).order_by(Task.punish_seq).all()
+
+    cursor = punished[-1].punish_seq if punished else since
+    response = json_response({
+        'punishments': [t.to_punishment_dict() for t in punished],
+        'cursor': cursor
+    })
+    return with_poll_interval(response, recommend_punishment_poll(user.id))
+
+@app.route('/admin/profiles', methods=['GET'])
+@admin_required
+def admin_profiles():
+    limit = request.args.get('limit', 20, type=int)
+    name = request.args.get('name')
+    return json_response(profiler.slowest(limit=limit, name=name))
+
+@app.route('/admin/profiles/<path:filename>', methods=['GET'])
+@admin_required
+def admin_profile_file(filename):
+    if not filename.endswith(('.folded', '.prof')):
+        abort(404)
+    return send_from_directory(profiler.directory, filename, as_attachment=True)
+
+@app.route('/admin/profile-token', methods=['POST'])
+@admin_required
+def admin_profile_token():
+    # このトークンを X-Profile-Token ヘッダに付けたリクエストは必ずプロファイルされる
+    user = get_current_user()
+    return json_response({
+        'header': 'X-Profile-Token',
+        'token': profiler.issue_token(user.username),
+        'expires_in': app.config['PROFILE_TOKEN_MAX_AGE']
+    })
+
+@app.route('/check_punishments/ack', methods=['POST'])
+@login_required
+def ack_punishments():
+    user = get_current_user()
+    data = request.get_json(silent=True) or {}
+    try:
+        cursor = int(data.get('cursor', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    # 受信確認は後退させず、割り当て済みの通番を超えないようにする
+    cursor = min(cursor, user.punish_seq or 0)
+    if cursor > (user.punish_ack_seq or 0):
+        user.punish_ack_seq = cursor
+        db.session.commit()
+    return json_response({'cursor': user.punish_ack_seq})
 
 @app.route('/add', methods=['POST'])
 @login_required
@@ -521,8 +1615,8 @@ def add_task():
         penalty_text=penalty_text
     )
     db.session.add(new_task)
+    enqueue_stats_update(user.id)
     db.session.commit()
-    update_user_stats(user.id)
     
     flash(f'タスク「{title}」を追加しました', 'success')
     return redirect(url_for('index'))
@@ -552,8 +1646,8 @@ def edit_task(task_id):
         task.title = title
         task.deadline = deadline_dt
         task.penalty_text = penalty_text
+        enqueue_stats_update(user.id)
         db.session.commit()
-        update_user_stats(user.id)
         
         flash(f'タスク「{title}」を更新しました', 'success')
         return redirect(url_for('index'))
@@ -570,14 +1664,14 @@ def delete_task(task_id):
         flash('タスクが見つかりません', 'error')
         return redirect(url_for('index'))
 
+    # 褒め言葉はワーカーが生成し、ダッシュボードの更新で表示される
     if task.deadline and task.deadline > datetime.now() and not task.is_punished:
-        message = generate_praise_with_ai(task.title)
-        flash(message, 'success')
+        enqueue_job('praise', {'task_id': task.id}, idempotency_key=f'praise:{task.id}', user_id=user.id)
 
     task.is_completed = True
     task.completed_at = datetime.now()
+    enqueue_stats_update(user.id)
     db.session.commit()
-    update_user_stats(user.id)
     
     return redirect(url_for('index'))
 
@@ -598,7 +1692,10 @@ def create_group():
     
     member = GroupMember(group_id=group.id, user_id=user.id)
     db.session.add(member)
+    bump_data_revision(user.id)
     db.session.commit()
+    # 未使用だった招待コードの「見つからない」結果もキャッシュしているため消す
+    cache.invalidate_tags('invites', f'group:{group.id}')
     
     flash(f'✅ グループ「{group_name}」を作成しました。招待コード: {invite_code}', 'success')
     return redirect(url_for('index'))
@@ -609,20 +1706,26 @@ def join_group():
     user = get_current_user()
     invite_code = request.form.get('invite_code', '').strip().upper()
     
-    group = Group.query.filter_by(invite_code=invite_code).first()
+    group = cache.get_or_set(
+        f'invite:{invite_code}', lambda: find_group_by_invite_code(invite_code),
+        ttl=300, tags=('invites',)
+    )
     if not group:
         flash('❌ 招待コードが見つかりません', 'error')
         return redirect(url_for('index'))
+    group_id, group_name = group
     
-    if GroupMember.query.filter_by(group_id=group.id, user_id=user.id).first():
+    if GroupMember.query.filter_by(group_id=group_id, user_id=user.id).first():
         flash('⚠️ このグループには既に参加しています', 'error')
         return redirect(url_for('index'))
     
-    member = GroupMember(group_id=group.id, user_id=user.id)
+    member = GroupMember(group_id=group_id, user_id=user.id)
     db.session.add(member)
+    bump_data_revision(user.id)
     db.session.commit()
+    cache.invalidate_tags(f'group:{group_id}')
     
-    flash(f'✅ グループ「{group.name}」に参加しました', 'success')
+    flash(f'✅ グループ「{group_name}」に参加しました', 'success')
     return redirect(url_for('index'))
 
 @app.route('/group/<int:group_id>/leave', methods=['POST'])
@@ -632,15 +1735,48 @@ def leave_group(group_id):
     member = GroupMember.query.filter_by(group_id=group_id, user_id=user.id).first()
     if member:
         db.session.delete(member)
+        bump_data_revision(user.id)
         db.session.commit()
+        cache.invalidate_tags(f'group:{group_id}')
         flash('グループから脱退しました', 'success')
     return redirect(url_for('index'))
 
+@app.route('/group/<int:group_id>/webhook', methods=['POST'])
+@login_required
+def set_group_webhook(group_id):
+    user = get_current_user()
+    group = Group.query.get(group_id)
+    if not group or group.created_by != user.id:
+        flash('❌ 通知先を設定できるのはグループの作成者だけです', 'error')
+        return redirect(url_for('index'))
+
+    webhook_url = request.form.get('webhook_url', '').strip()
+    if webhook_url and not webhook_url.startswith(tuple(app.config['WEBHOOK_ALLOWED_PREFIXES'])):
+        flash('❌ Discord の Webhook URL を入力してください', 'error')
+        return redirect(url_for('index'))
+
+    group.webhook_url = webhook_url or None
+    # 「通知先設定済み」の表示が変わるので、メンバー全員のグループ一覧を作り直す
+    member_ids = [row.user_id for row in GroupMember.query.with_entities(GroupMember.user_id).filter_by(group_id=group_id)]
+    if member_ids:
+        bump_data_revision(*member_ids)
+    db.session.commit()
+
+    flash('🔔 処刑の通知先を設定しました' if webhook_url else '🔕 処刑の通知先を解除しました', 'success')
+    return redirect(url_for('index'))
+
 
 scheduler = APScheduler()
 scheduler.init_app(app)
 scheduler.add_job(id='deadline_check_job', func=check_deadlines, trigger='interval', seconds=10)
-scheduler.start()
+if app.config['ARCHIVE_INTERVAL_MINUTES'] > 0:
+    scheduler.add_job(id='archive_tasks_job', func=archive_finalized_tasks, trigger='interval',
+                      minutes=app.config['ARCHIVE_INTERVAL_MINUTES'])
+if app.config['JOB_PRUNE_INTERVAL_MINUTES'] > 0:
+    scheduler.add_job(id='prune_jobs_job', func=prune_finished_jobs, trigger='interval',
+                      minutes=app.config['JOB_PRUNE_INTERVAL_MINUTES'])
+if app.config['SCHEDULER_ENABLED']:
+    scheduler.start()
 
 @app.errorhandler(404)
 def not_found(error):
@@ -651,6 +1787,7 @@ def internal_error(error):
     db.session.rollback()
     return jsonify({'error': 'Internal server error'}), 500
 
+# 開発用の起動。本番は gunicorn -c gunicorn.conf.py app:app を使う
 if __name__ == '__main__':
     init_db()
     print("=" * 60)
@@ -658,4 +1795,7 @@ if __name__ == '__main__':
     print("=" * 60)
     print("🌐 http://localhost:5000")
     print("=" * 60)
-    app.run(debug=True, use_reloader=False)
\ No newline at end of file
+    job_stop_event = threading.Event()
+    start_job_workers(app.config['JOB_WORKERS'], job_stop_event)
+    app.run(debug=True, use_reloader=False)
+    job_stop_event.set()
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""/api/rankings と /api/tasks の転送量と CPU 時間を、旧実装（ORM + jsonify）と比較する
+
+使い方:
+    python benchmarks/bench_api_serialization.py --users 5000 --tasks 60 --iterations 30
+"""
+import argparse
+import time
+
+from flask import jsonify, session
+
+from common import load_app, seed_scaled
+
+
+def legacy_rankings(app_module):
+    # 変更前の api_rankings と同じ処理（全件を ORM で読み込み、ユーザーを1件ずつ取得）
+    all_stats = app_module.UserStats.query.all()
+    rankings = []
+    for stat in sorted(all_stats, key=lambda x: x.laziness_score, reverse=True):
+        user = app_module.User.query.get(stat.user_id)
+        if user:
+            rankings.append({
+                'rank': len(rankings) + 1,
+                'username': user.display_name or user.username,
+                'laziness_score': stat.laziness_score,
+                'completed_tasks': stat.completed_tasks,
+                'punished_tasks': stat.punished_tasks
+            })
+    return jsonify(rankings)
+
+
+def legacy_tasks(app_module, user_id):
+    Task = app_module.Task
+    tasks = Task.query.filter_by(user_id=user_id, is_completed=False).order_by(Task.created_at.desc()).all()
+    return jsonify([t.to_dict() for t in tasks])
+
+
+def measure(app_module, user_id, view, accept_encoding, iterations):
+    # リクエストごとに新しいコンテキストを作り、セッションの identity map を持ち越さない
+    cpu_total = 0.0
+    size = 0
+    for i in range(iterations + 1):
+        with app_module.app.test_request_context(headers={'Accept-Encoding': accept_encoding}):
+            session['user_id'] = user_id
+            started = time.process_time()
+            response = view()
+            if isinstance(response, tuple):
+                response = response[0]
+            size = len(response.get_data())
+            if i > 0:  # 1回目はウォームアップとして除外
+                cpu_total += time.process_time() - started
+    return size, cpu_total / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API シリアライズのベンチマーク')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--tasks', type=int, default=60, help='ユーザーあたりのタスク数')
+    parser.add_argument('--iterations', type=int, default=30)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    print(f"🌱 データ投入中... (users={args.users}, tasks/user={args.tasks})")
+    user_id = seed_scaled(app_module, users=args.users, tasks_per_user=args.tasks)
+
+    # /api/rankings はキャッシュ越しに返すので、シリアライズの比較では読み込みと JSON 化を直接呼ぶ。
+    # キャッシュに当たった場合は別の行として測る
+    def rankings_view():
+        return app_module.json_response(app_module.load_global_rankings())
+
+    cached_rankings_view = app_module.api_rankings.__wrapped__
+    tasks_view = app_module.api_tasks.__wrapped__
+    variants = [
+        ('/api/rankings', '旧実装 (ORM + jsonify)', lambda: legacy_rankings(app_module), 'identity'),
+        ('/api/rankings', '新実装 (非圧縮)', rankings_view, 'identity'),
+        ('/api/rankings', '新実装 (gzip)', rankings_view, 'gzip'),
+        ('/api/rankings', '新実装 (キャッシュ命中, gzip)', cached_rankings_view, 'gzip'),
+        ('/api/tasks', '旧実装 (ORM + jsonify)', lambda: legacy_tasks(app_module, user_id), 'identity'),
+        ('/api/tasks', '新実装 (非圧縮)', tasks_view, 'identity'),
+        ('/api/tasks', '新実装 (gzip)', tasks_view, 'gzip'),
+    ]
+    if app_module.brotli is not None:
+        variants.insert(3, ('/api/rankings', '新実装 (br)', rankings_view, 'br'))
+        variants.append(('/api/tasks', '新実装 (br)', tasks_view, 'br'))
+
+    print(f"JSON エンコーダ: {'orjson' if app_module.orjson else '標準 json'}")
+    print("=" * 72)
+    print(f"{'エンドポイント':<16}{'実装':<28}{'バイト数':>12}{'CPU ms/回':>14}")
+    print("-" * 72)
+    baseline = {}
+    for endpoint, label, view, encoding in variants:
+        size, cpu_ms = measure(app_module, user_id, view, encoding, args.iterations)
+        base_size, base_cpu = baseline.setdefault(endpoint, (size, cpu_ms))
+        print(f"{endpoint:<16}{label:<28}{size:>12,}{cpu_ms:>14.2f}"
+              f"   ({size / base_size:.0%} / {cpu_ms / base_cpu:.0%})")
+    print("=" * 72)
+    print("括弧内は旧実装に対するバイト数 / CPU 時間の比率")
+    print("キャッシュ命中の行は、ウォームアップで載せた /api/rankings をそのまま返す時間")
+
+
+if __name__ == '__main__':
+    main()
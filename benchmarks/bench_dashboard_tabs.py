@@ -0,0 +1,201 @@
+"""本番構成（gunicorn.conf.py）で、同時に開かれたダッシュボードのタブ数ごとの応答を測る
+
+--mode fixed    : 以前のクライアントと同じ固定間隔でポーリングする
+                  （/check_punishments 3秒、/api/stats 5秒、/api/tasks 10秒、/api/rankings 15秒）
+--mode adaptive : 現在のクライアントと同じく、応答の X-Poll-Interval に従って次回を決める
+                  （/check_punishments と /api/dashboard）
+待ち時間は予定時刻から応答完了までで測るので、サーバーが追いつかず要求が遅れた分も遅延に含まれる。
+
+使い方:
+    python benchmarks/bench_dashboard_tabs.py --tabs 100,200,400 --duration 30
+    python benchmarks/bench_dashboard_tabs.py --worker-class gevent --workers 2
+    python benchmarks/bench_dashboard_tabs.py --mode fixed --tabs 200 --duration 120
+"""
+import argparse
+import heapq
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from common import ROOT, load_app, seed_scaled
+
+FIXED_POLLS = (
+    ('/check_punishments', 3.0),
+    ('/api/stats', 5.0),
+    ('/api/tasks', 10.0),
+    ('/api/rankings', 15.0),
+)
+
+# adaptive の初回間隔（ヘッダが無い場合もこれを使う）
+ADAPTIVE_POLLS = (
+    ('/check_punishments', 3.0),
+    ('/api/dashboard', 60.0),
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(db_path, port, args):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f'sqlite:///{db_path}',
+        'BIND': f'127.0.0.1:{port}',
+        'WEB_WORKERS': str(args.workers),
+        'WORKER_CLASS': args.worker_class,
+        'WEB_THREADS': str(args.threads),
+    })
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/login', timeout=1)
+            return server
+        except requests.RequestException:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError('gunicorn が起動しませんでした')
+
+
+def make_sessions(app_module, base_url, user_ids):
+    # ログイン（パスワードハッシュ検証）を省くため、署名済みのセッション Cookie を直接作る
+    serializer = app_module.app.session_interface.get_signing_serializer(app_module.app)
+    cookie_name = app_module.app.config['SESSION_COOKIE_NAME']
+    sessions = []
+    for uid in user_ids:
+        http = requests.Session()
+        http.cookies.set(cookie_name, serializer.dumps({'user_id': uid}), domain='127.0.0.1')
+        sessions.append(http)
+    return sessions
+
+
+def run_step(base_url, sessions, duration, concurrency, adaptive):
+    latencies = []
+    errors = 0
+    lock = threading.Condition()
+    start = time.monotonic()
+    end = start + duration
+    polls = ADAPTIVE_POLLS if adaptive else FIXED_POLLS
+
+    # タブごとの開始をずらし、すべてのタブが同じ瞬間に要求しないようにする
+    queue = []
+    for i, http in enumerate(sessions):
+        for path, interval in polls:
+            offset = interval * i / len(sessions)
+            heapq.heappush(queue, (start + offset, i, path, interval))
+
+    def fire(scheduled, i, path, interval):
+        nonlocal errors
+        next_interval = interval
+        try:
+            response = sessions[i].get(base_url + path, timeout=30)
+            ok = response.status_code == 200
+            if adaptive and response.headers.get('X-Poll-Interval'):
+                next_interval = float(response.headers['X-Poll-Interval'])
+        except requests.RequestException:
+            ok = False
+        finished = time.monotonic()
+        with lock:
+            latencies.append(finished - scheduled)
+            if not ok:
+                errors += 1
+            if adaptive:
+                # ブラウザと同じく、応答を受け取ってから次回を予約する
+                heapq.heappush(queue, (finished + next_interval, i, path, interval))
+                lock.notify()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            with lock:
+                if not queue or queue[0][0] >= end:
+                    if time.monotonic() >= end:
+                        break
+                    lock.wait(0.05)
+                    continue
+                delay = queue[0][0] - time.monotonic()
+                if delay > 0:
+                    lock.wait(min(delay, 0.05))
+                    continue
+                scheduled, i, path, interval = heapq.heappop(queue)
+                if not adaptive:
+                    heapq.heappush(queue, (scheduled + interval, i, path, interval))
+            pool.submit(fire, scheduled, i, path, interval)
+
+    latencies.sort()
+    total = len(latencies)
+
+    def percentile(p):
+        return latencies[min(total - 1, int(total * p))] * 1000 if total else 0.0
+
+    return {
+        'requests': total,
+        'rps': total / duration,
+        'p50': percentile(0.50),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='同時タブ数ごとのダッシュボード負荷ベンチマーク')
+    parser.add_argument('--tabs', default='50,100,200,400', help='カンマ区切りのタブ数')
+    parser.add_argument('--duration', type=float, default=30, help='各段階の計測秒数')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--worker-class', default='gthread')
+    parser.add_argument('--concurrency', type=int, default=64, help='負荷生成側の同時要求数')
+    parser.add_argument('--p95-limit', type=float, default=250.0, help='維持できたとみなす p95 (ms)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--mode', choices=('adaptive', 'fixed'), default='adaptive')
+    args = parser.parse_args()
+
+    steps = [int(n) for n in args.tabs.split(',')]
+    app_module = load_app()
+    db_path = app_module.app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+    print(f"🌱 データ投入中... (users={args.users})")
+    first_user = seed_scaled(app_module, users=args.users, tasks_per_user=20)
+
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    print(f"🚀 gunicorn 起動中 ({args.worker_class}, workers={args.workers}, threads={args.threads}, mode={args.mode})")
+    server = start_server(db_path, port, args)
+
+    sustained = 0
+    try:
+        print("=" * 78)
+        print(f"{'タブ数':>8}{'目標 req/s':>12}{'実績 req/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'エラー':>8}")
+        print("-" * 78)
+        for tabs in steps:
+            user_ids = [first_user + (i % args.users) for i in range(tabs)]
+            sessions = make_sessions(app_module, base_url, user_ids)
+            # 固定間隔なら要求数は決まっている。adaptive ではサーバーの指示次第なので実績だけを見る
+            target = f"{tabs * sum(1 / interval for _, interval in FIXED_POLLS):.1f}" if args.mode == 'fixed' else '-'
+            result = run_step(base_url, sessions, args.duration, args.concurrency, args.mode == 'adaptive')
+            print(f"{tabs:>8}{target:>12}{result['rps']:>12.1f}{result['p50']:>10.1f}"
+                  f"{result['p95']:>10.1f}{result['p99']:>10.1f}{result['errors']:>8}")
+            if result['p95'] <= args.p95_limit and result['errors'] <= result['requests'] * 0.01:
+                sustained = tabs
+            for http in sessions:
+                http.close()
+        print("=" * 78)
+        print(f"✅ p95 {args.p95_limit:.0f}ms 以内・エラー1%未満で維持できたタブ数: {sustained}")
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""締め切りが同じ時刻に集中したとき（23:59 問題）の、締め切りチェックと Discord 通知の処理能力を測る
+
+--tasks 件のタスクを、開始 --lead 秒後から --window 秒の間に期限が来るように投入し、
+本番と同じ部品（check_deadlines を --tick 秒ごと + ジョブワーカー --workers 本）で処理する。
+Discord の代わりにローカルのスタブサーバーへ投稿させ、応答の遅延とエラー率、レート制限（429 と
+Retry-After）を返す割合を指定できる。
+全体の Webhook に加え、--group-webhooks 個のグループにも Webhook を登録して、グループへの配信も測る。
+
+報告する値:
+    期限 -> 処刑     : タスクの期限から check_deadlines が処刑済みにするまで（punished_at - deadline）
+    期限 -> 通知     : タスクの期限から、各通知先のスタブが投稿を受け取るまで（リトライ後の成功を含む）
+    処理能力         : 1回の check_deadlines が処理した件数/秒、通知の配信件数/秒
+    DB ロック待ち    : トランザクションの最初の書き込み文の所要時間。SQLite はここで書き込みロックを
+                       取るので、他の書き込みと競合した分の待ち時間がそのまま表れる
+
+使い方:
+    python benchmarks/bench_deadline_storm.py --tasks 5000 --window 60 --workers 8 --latency-ms 50
+    python benchmarks/bench_deadline_storm.py --tasks 20000 --error-rate 0.05 --timeout 900
+    python benchmarks/bench_deadline_storm.py --group-webhooks 10 --digest-window 10
+    python benchmarks/bench_deadline_storm.py --group-webhooks 10 --rate-limit-rate 0.3 --retry-after 2
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import event
+
+from common import load_app, seed_scaled
+
+TITLE_PREFIX = 'storm-'
+TITLE_PATTERN = re.compile(r'「(' + TITLE_PREFIX + r'\d+)」')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class StubWebhook:
+    """Discord の Webhook の代わりに投稿を受け、(通知先, タスク) ごとの最初の成功時刻を記録する"""
+
+    def __init__(self, latency, error_rate, seed=0, rate_limit_rate=0.0, retry_after=1.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.delivered = {}
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                time.sleep(stub.latency)
+                with stub._lock:
+                    stub.requests += 1
+                    roll = stub._rng.random()
+                    limited = roll < stub.rate_limit_rate
+                    failed = not limited and roll < stub.rate_limit_rate + stub.error_rate
+                    if limited:
+                        stub.rate_limited += 1
+                    elif failed:
+                        stub.errors += 1
+                    else:
+                        # ダイジェストには複数の埋め込み・フィールドで複数の処刑が入っている
+                        received = time.time()
+                        for embed in json.loads(body)['embeds']:
+                            for field in embed['fields']:
+                                for title in TITLE_PATTERN.findall(field['name'] + field['value']):
+                                    stub.delivered.setdefault((self.path, title), received)
+                if limited:
+                    # Discord と同じく、ヘッダと本文の両方で待ち時間を返す
+                    payload = json.dumps({'message': 'You are being rate limited.',
+                                          'retry_after': stub.retry_after}).encode()
+                    self.send_response(429)
+                    self.send_header('Retry-After', str(stub.retry_after))
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                self.send_response(500 if failed else 204)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/webhook'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LockProbe:
+    """トランザクションを開始する書き込み文の所要時間を、スレッドの役割ごとに集める"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.waits = {}
+        self._lock = threading.Lock()
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        # sqlite3 モジュールは最初の書き込み文の直前に BEGIN を出し、その文で書き込みロックを取る
+        if statement.lstrip()[:6].upper() in WRITE_STATEMENTS and \
+                not conn.connection.dbapi_connection.in_transaction:
+            context._lock_probe_started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        # ORM の一括 INSERT は1つの context で複数回実行されるので、最初の1回だけ数える
+        started = context.__dict__.pop('_lock_probe_started', None)
+        if started is None:
+            return
+        role = 'worker' if threading.current_thread().name.startswith('job-worker') else 'scheduler'
+        with self._lock:
+            self.waits.setdefault(role, []).append(time.perf_counter() - started)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before)
+        event.listen(self.engine, 'after_cursor_execute', self._after)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._before)
+        event.remove(self.engine, 'after_cursor_execute', self._after)
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {key: 0.0 for key in ('p50', 'p90', 'p99', 'max')}
+
+    def pick(p):
+        return values[min(len(values) - 1, int(len(values) * p))]
+
+    return {'p50': pick(0.50), 'p90': pick(0.90), 'p99': pick(0.99), 'max': values[-1]}
+
+
+def seed_storm(app_module, user_ids, count, start, window):
+    rng = random.Random(1)
+    rows = [{
+        'user_id': user_ids[i % len(user_ids)],
+        'title': f'{TITLE_PREFIX}{i}',
+        'deadline': start + timedelta(seconds=rng.uniform(0, window)),
+        'penalty_text': '23:59 の締め切りに間に合いませんでした。',
+        'is_punished': False,
+        'is_completed': False,
+        'created_at': start - timedelta(days=1)
+    } for i in range(count)]
+    with app_module.app.app_context():
+        for offset in range(0, len(rows), 20000):
+            app_module.db.session.execute(app_module.Task.__table__.insert(), rows[offset:offset + 20000])
+        app_module.db.session.commit()
+
+
+def register_group_webhooks(app_module, count, base_url):
+    Group = app_module.Group
+    with app_module.app.app_context():
+        groups = Group.query.order_by(Group.id).limit(count).all()
+        for group in groups:
+            group.webhook_url = f'{base_url}/group/{group.id}'
+        app_module.db.session.commit()
+        return len(groups)
+
+
+def delivery_pending(app_module):
+    # 処刑されていない嵐のタスク、未送信の通知、実行待ちの投稿ジョブのどれかが残っていれば True
+    Task, Notice, Job = app_module.Task, app_module.PunishmentNotice, app_module.Job
+    with app_module.app.app_context():
+        unpunished = Task.query.filter(Task.title.like(f'{TITLE_PREFIX}%'), Task.is_punished == False).count()
+        unsent = Notice.query.filter(Notice.sent_at == None).count()
+        jobs = Job.query.filter(Job.kind == 'webhook_digest', Job.status.in_(('queued', 'running'))).count()
+        return unpunished + unsent + jobs > 0
+
+
+def run_scheduler(app_module, tick, stop_event, ticks):
+    # APScheduler の interval と同じく、前回の開始から tick 秒ごとに実行する
+    Task = app_module.Task
+    next_run = time.monotonic()
+    while not stop_event.is_set():
+        started = time.monotonic()
+        with app_module.app.app_context():
+            before = Task.query.filter(Task.is_punished == True).count()
+        app_module.check_deadlines()
+        elapsed = time.monotonic() - started
+        with app_module.app.app_context():
+            after = Task.query.filter(Task.is_punished == True).count()
+        ticks.append((elapsed, after - before))
+        next_run += tick
+        stop_event.wait(max(0.0, next_run - time.monotonic()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='締め切り集中時の処理能力ベンチマーク')
+    parser.add_argument('--tasks', type=int, default=5000, help='同時に期限を迎えるタスク数')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--window', type=float, default=60, help='期限が分布する幅（秒）')
+    parser.add_argument('--lead', type=float, default=5, help='計測開始から最初の期限までの秒数')
+    parser.add_argument('--tick', type=float, default=10, help='check_deadlines の実行間隔（本番は10秒）')
+    parser.add_argument('--workers', type=int, default=8, help='ジョブワーカーのスレッド数')
+    parser.add_argument('--job-poll', type=float, default=1.0, help='JOB_POLL_INTERVAL（秒）')
+    parser.add_argument('--latency-ms', type=float, default=50, help='スタブ Webhook の応答遅延')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='スタブ Webhook が 500 を返す割合')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='スタブ Webhook が 429 を返す割合')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429 で返す Retry-After（秒）')
+    parser.add_argument('--timeout', type=float, default=600, help='全件の通知を待つ上限（秒）')
+    parser.add_argument('--group-webhooks', type=int, default=0, help='Webhook を登録するグループ数（最大10）')
+    parser.add_argument('--digest-window', type=int, default=None, help='WEBHOOK_DIGEST_WINDOW（秒）')
+    args = parser.parse_args()
+
+    app_module = load_app()
+    app_module.app.config['JOB_POLL_INTERVAL'] = args.job_poll
+    if args.digest_window is not None:
+        app_module.app.config['WEBHOOK_DIGEST_WINDOW'] = args.digest_window
+    print(f"🌱 データ投入中... (users={args.users}, tasks={args.tasks})")
+    first_user = seed_scaled(app_module, users=args.users, tasks_per_user=5, groups=10)
+    user_ids = list(range(first_user, first_user + args.users))
+    storm_start = datetime.now() + timedelta(seconds=args.lead)
+    seed_storm(app_module, user_ids, args.tasks, storm_start, args.window)
+
+    stub = StubWebhook(args.latency_ms / 1000, args.error_rate,
+                       rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after)
+    stub.start()
+    os.environ['DISCORD_WEBHOOK_URL'] = f'{stub.url}/global'
+    group_webhooks = register_group_webhooks(app_module, args.group_webhooks, stub.url)
+
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+
+    print(f"🌩️ 実行中... (window={args.window:.0f}s, tick={args.tick:.0f}s, workers={args.workers}, "
+          f"latency={args.latency_ms:.0f}ms, error_rate={args.error_rate:.0%}, rate_limit={args.rate_limit_rate:.0%}, "
+          f"group_webhooks={group_webhooks}, digest={app_module.app.config['WEBHOOK_DIGEST_WINDOW']}s)")
+    ticks = []
+    stop_event = threading.Event()
+    log = io.StringIO()
+    started = time.monotonic()
+    with LockProbe(engine) as probe, contextlib.redirect_stdout(log):
+        scheduler = threading.Thread(target=run_scheduler, name='deadline-scheduler',
+                                     args=(app_module, args.tick, stop_event, ticks), daemon=True)
+        scheduler.start()
+        workers = app_module.start_job_workers(args.workers, stop_event)
+
+        deadline = started + args.lead + args.window + args.timeout
+        while time.monotonic() < deadline:
+            time.sleep(1)
+            print(f"\r  配信済み {len(stub.delivered):,} 件  Webhook 要求 {stub.requests:,} 回",
+                  end='', file=sys.stderr)
+            if time.monotonic() > started + args.lead + args.window and not delivery_pending(app_module):
+                break
+        print(file=sys.stderr)
+        stop_event.set()
+        scheduler.join(timeout=60)
+        for worker in workers:
+            worker.join(timeout=30)
+    stub.stop()
+
+    Task, Notice = app_module.Task, app_module.PunishmentNotice
+    with app_module.app.app_context():
+        rows = Task.query.with_entities(Task.title, Task.deadline, Task.punished_at).filter(
+            Task.title.like(f'{TITLE_PREFIX}%')
+        ).all()
+        notices = Notice.query.count()
+        dead = app_module.DeadJob.query.count()
+    deadlines = {r.title: r.deadline.timestamp() for r in rows}
+    punish_latency = [(r.punished_at - r.deadline).total_seconds() for r in rows if r.punished_at]
+    deliver_latency = [received - deadlines[title] for (path, title), received in stub.delivered.items()]
+
+    busy_ticks = [(elapsed, count) for elapsed, count in ticks if count]
+    deliveries = sorted(stub.delivered.values())
+    delivery_span = deliveries[-1] - deliveries[0] if len(deliveries) > 1 else 0
+
+    print("=" * 72)
+    print(f"{'区間':<20}{'件数':>8}{'p50 s':>10}{'p90 s':>10}{'p99 s':>10}{'max s':>10}")
+    print("-" * 72)
+    for label, values in (('期限 -> 処刑', punish_latency), ('期限 -> 通知', deliver_latency)):
+        p = percentiles(values)
+        print(f"{label:<20}{len(values):>8,}{p['p50']:>10.2f}{p['p90']:>10.2f}{p['p99']:>10.2f}{p['max']:>10.2f}")
+    print("-" * 72)
+    print("処理能力")
+    for elapsed, count in busy_ticks:
+        print(f"  check_deadlines: {count:>7,} 件 / {elapsed:6.2f} 秒 = {count / elapsed:>9,.0f} 件/秒")
+    if delivery_span:
+        print(f"  通知の配信      : {len(deliveries):>7,} 件 / {delivery_span:6.2f} 秒 = "
+              f"{len(deliveries) / delivery_span:>9,.0f} 件/秒")
+    print("-" * 72)
+    print(f"{'DB ロック待ち':<20}{'回数':>8}{'合計 s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for role, waits in sorted(probe.waits.items()):
+        p = percentiles(waits)
+        print(f"  {role:<18}{len(waits):>8,}{sum(waits):>10.2f}{p['p50'] * 1000:>10.1f}"
+              f"{p['p99'] * 1000:>10.1f}{p['max'] * 1000:>10.1f}")
+    print("-" * 72)
+    print(f"Webhook: 要求 {stub.requests:,} 回（処刑1件・通知先1つごとに投稿すると {notices:,} 回）/ "
+          f"注入したエラー {stub.errors:,} 回 / 429 {stub.rate_limited:,} 回")
+    print(f"未処刑 {len(rows) - len(punish_latency):,} 件 / 未配信 {notices - len(stub.delivered):,} 件 / "
+          f"デッドレター {dead:,} 件")
+    print("=" * 72)
+
+
+if __name__ == '__main__':
+    main()
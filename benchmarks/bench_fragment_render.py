@@ -0,0 +1,119 @@
+"""index と profile の描画時間とクエリ数を、断片キャッシュの有無で比較する
+
+3 通りを測る:
+    キャッシュ無効   : FRAGMENT_CACHE_TTL=0（毎回 DB から読み、パネルを描画する）
+    キャッシュ失効   : 毎回 data_revision を上げてから描画する（データ更新直後の最悪値）
+    キャッシュヒット : 版数が変わらず、パネルをキャッシュから再利用する
+
+使い方:
+    python benchmarks/bench_fragment_render.py --users 2000 --tasks 40 --badges 3 --iterations 200
+"""
+import argparse
+import time
+from datetime import datetime
+
+from flask import session
+from sqlalchemy import event
+
+from common import load_app, seed_scaled
+
+BADGES = (
+    ('streak_7', '7日連続達成者', '🔥'),
+    ('completion_10', '10個完了達成者', '✨'),
+    ('perfect', '完璧主義者', '👑'),
+)
+
+
+def seed_badges(app_module, user_ids, per_user):
+    now = datetime.now()
+    with app_module.app.app_context():
+        app_module.db.session.execute(app_module.Badge.__table__.insert(), [{
+            'user_id': uid,
+            'badge_type': badge_type,
+            'badge_name': name,
+            'badge_icon': icon,
+            'unlocked_at': now
+        } for uid in user_ids for badge_type, name, icon in BADGES[:per_user]])
+        app_module.db.session.commit()
+
+
+def bump_revision(app_module, user_id):
+    with app_module.app.app_context():
+        app_module.bump_data_revision(user_id)
+        app_module.db.session.commit()
+
+
+def measure(app_module, view, user_id, iterations, before_each=None):
+    queries = []
+
+    def count(*args):
+        queries.append(args[2])
+
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        elapsed = 0.0
+        total_queries = 0
+        for i in range(iterations + 1):
+            if before_each:
+                before_each()
+            queries.clear()
+            # リクエストごとに新しいコンテキストを作り、セッションの identity map を持ち越さない
+            with app_module.app.test_request_context():
+                session['user_id'] = user_id
+                started = time.perf_counter()
+                view()
+                if i > 0:  # 1回目はウォームアップとして除外
+                    elapsed += time.perf_counter() - started
+                    total_queries += len(queries)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return elapsed / iterations * 1000, total_queries / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='断片キャッシュによるページ描画のベンチマーク')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--tasks', type=int, default=40, help='ユーザーあたりのタスク数')
+    parser.add_argument('--badges', type=int, default=3, help='ユーザーあたりのバッジ数（最大3）')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    print(f"🌱 データ投入中... (users={args.users}, tasks/user={args.tasks}, badges/user={args.badges})")
+    first_user = seed_scaled(app_module, users=args.users, tasks_per_user=args.tasks)
+    user_ids = list(range(first_user, first_user + args.users))
+    seed_badges(app_module, user_ids, min(args.badges, len(BADGES)))
+    user_id = first_user + args.users // 2
+
+    config = app_module.app.config
+    ttl = config['FRAGMENT_CACHE_TTL'] or 600
+    pages = [
+        ('/', app_module.index.__wrapped__),
+        ('/profile', app_module.profile.__wrapped__),
+    ]
+
+    print("=" * 72)
+    print(f"{'ページ':<12}{'条件':<20}{'ms/回':>12}{'クエリ/回':>12}")
+    print("-" * 72)
+    for path, view in pages:
+        variants = [
+            ('キャッシュ無効', 0, None),
+            ('キャッシュ失効', ttl, lambda: bump_revision(app_module, user_id)),
+            ('キャッシュヒット', ttl, None),
+        ]
+        baseline = None
+        for label, variant_ttl, before_each in variants:
+            config['FRAGMENT_CACHE_TTL'] = variant_ttl
+            app_module.cache.clear()
+            ms, queries = measure(app_module, view, user_id, args.iterations, before_each)
+            baseline = baseline or ms
+            print(f"{path:<12}{label:<20}{ms:>12.2f}{queries:>12.1f}   ({ms / baseline:.0%})")
+        print("-" * 72)
+    config['FRAGMENT_CACHE_TTL'] = ttl
+    print("括弧内はキャッシュ無効に対する描画時間の比率")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,566 @@
+"""長時間の連続稼働で、メモリ・DB 接続・スレッドが少しずつ増えていかないかを確かめる（ソークテスト）
+
+Web サーバー（werkzeug のスレッド版）、APScheduler の締め切りチェック、ジョブワーカーを
+1つのプロセスで動かし、--clients 本のスレッドが --users 人の利用者として操作し続ける。
+利用者はダッシュボードのポーリング、ページ表示、タスクの追加・完了、期限切れタスクの追加（処刑と
+Webhook 通知が走る）、グループへの参加・脱退を混ぜて行う。Discord の代わりにスタブへ投稿する。
+
+--interval 秒ごとに次の値を記録する（gc.collect() の後に測る）:
+    RSS            : プロセスの常駐メモリ（psutil があれば使い、無ければ /proc/self/statm）
+    traced         : tracemalloc が追跡している Python オブジェクトの合計と、基準からの増加が大きい箇所
+    DB 接続        : プールが開いている接続数と、貸し出し中の数
+    fd             : 開いているファイル記述子の数（Linux のみ。SQLite の接続は db/wal/shm を開く）
+    threads        : Python のスレッド数
+    エラー / DLQ   : 本体が出力したエラーの行（「...エラー: ...」と Flask が記録した例外）と dead_jobs の件数
+--warmup 秒の後の最初の計測を基準にし、最後の3回の中央値との差が閾値を超えたら終了コード 1 で終わる。
+エラーの行やデッドレターが1件でもあれば、増加量にかかわらず終了コード 1 で終わる。
+1時間あたりの増加量（最小二乗の傾き）も表示するので、短い実行から数日後の値を見積もれる。
+
+使い方:
+    python benchmarks/bench_soak.py --duration 30m --users 200 --clients 8
+    python benchmarks/bench_soak.py --duration 12h --interval 300 --warmup 30m --output soak.jsonl
+    CACHE_BACKEND=sqlite python benchmarks/bench_soak.py --duration 2h --max-fd-growth 10
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import event
+from werkzeug.serving import make_server
+
+from bench_dashboard_tabs import make_sessions
+from bench_deadline_storm import StubWebhook
+from common import load_app, seed_scaled
+
+# RSS の取得に使う。無ければ /proc/self/statm を読む
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# (操作, 重み)。ダッシュボードを開いたままのタブが大半で、書き込みはときどき起きる
+ACTIONS = (
+    ('poll_punishments', 40),
+    ('dashboard', 15),
+    ('index', 5),
+    ('profile', 3),
+    ('history', 2),
+    ('add_task', 8),
+    ('add_overdue_task', 4),
+    ('complete_task', 8),
+    ('toggle_group', 1),
+)
+
+METRICS = (
+    # (キー, 表示名, 単位, 閾値の引数名)
+    ('rss_mb', 'RSS', 'MB', 'max_rss_growth'),
+    ('traced_mb', 'traced', 'MB', 'max_traced_growth'),
+    ('db_open', 'DB 接続', '本', 'max_connection_growth'),
+    ('fds', 'fd', '個', 'max_fd_growth'),
+    ('threads', 'threads', '本', 'max_thread_growth'),
+)
+
+
+def parse_duration(text):
+    """'90', '30s', '15m', '12h', '3d' を秒に直す"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*', text)
+    if not match:
+        raise argparse.ArgumentTypeError(f'期間の形式が不正です: {text}')
+    value, unit = match.groups()
+    return float(value) * {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}[unit]
+
+
+def read_rss_mb():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return None
+
+
+def count_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+class ConnectionCounter:
+    """プールが DBAPI 接続を開いた・閉じた回数を数え、開いたままの接続数を出す"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        # 計測開始前にプールへ入った接続も数に入れる
+        self.opened = engine.pool.checkedin() + engine.pool.checkedout() if hasattr(engine.pool, 'checkedin') else 0
+        self.closed = 0
+        self._lock = threading.Lock()
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.opened += 1
+
+    def _on_close(self, dbapi_connection, connection_record=None):
+        with self._lock:
+            self.closed += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'connect', self._on_connect)
+        event.listen(self.engine, 'close', self._on_close)
+        event.listen(self.engine, 'close_detached', self._on_close)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'connect', self._on_connect)
+        event.remove(self.engine, 'close', self._on_close)
+        event.remove(self.engine, 'close_detached', self._on_close)
+
+    @property
+    def open(self):
+        with self._lock:
+            return self.opened - self.closed
+
+    @property
+    def checked_out(self):
+        checkedout = getattr(self.engine.pool, 'checkedout', None)
+        return checkedout() if checkedout else None
+
+
+class AppLog(io.TextIOBase):
+    """本体の標準出力の代わり。全体は捨て、エラーの行だけを数えて直近の分を残す"""
+
+    def __init__(self, keep=20):
+        self.error_lines = 0
+        self.recent = deque(maxlen=keep)
+        self._buffer = ''
+        self._lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        with self._lock:
+            self._buffer += text
+            *lines, self._buffer = self._buffer.split('\n')
+            for line in lines:
+                # 本体はエラーを「〇〇エラー: ...」「ジョブ実行エラー (...)」の形で print する
+                if 'エラー' in line:
+                    self.error_lines += 1
+                    self.recent.append(line.strip())
+        return len(text)
+
+
+class SimulatedUsers:
+    """--clients 本のスレッドで、割り当てた利用者の操作を重み付きでランダムに繰り返す"""
+
+    def __init__(self, base_url, sessions, user_ids, invite_codes, clients, think, max_pending, seed=0):
+        self.base_url = base_url
+        self.sessions = sessions
+        self.user_ids = user_ids
+        self.invite_codes = invite_codes
+        self.clients = clients
+        self.think = think
+        self.max_pending = max_pending
+        self.seed = seed
+        self.counts = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self, stop_event):
+        for i in range(self.clients):
+            thread = threading.Thread(target=self._run, args=(i, stop_event), name=f'soak-client-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self, client, stop_event):
+        rng = random.Random(self.seed + client)
+        mine = list(range(client, len(self.sessions), self.clients))
+        names = [name for name, _ in ACTIONS]
+        weights = [weight for _, weight in ACTIONS]
+        while not stop_event.is_set():
+            i = rng.choice(mine)
+            action = rng.choices(names, weights)[0]
+            try:
+                ok = getattr(self, action)(self.sessions[i], rng)
+            except requests.RequestException:
+                ok = False
+            with self._lock:
+                self.counts[action] += 1
+                if not ok:
+                    self.errors[action] += 1
+            stop_event.wait(rng.uniform(0, 2 * self.think))
+
+    def _get(self, http, path, **kwargs):
+        return http.get(self.base_url + path, timeout=30, **kwargs)
+
+    def _post(self, http, path, **kwargs):
+        # ブラウザと同じくリダイレクト先も表示し、flash を消費してセッション Cookie を膨らませない
+        return http.post(self.base_url + path, timeout=30, **kwargs)
+
+    def poll_punishments(self, http, rng):
+        response = self._get(http, '/check_punishments')
+        if response.status_code != 200:
+            return False
+        data = response.json()
+        if data['punishments']:
+            # ブラウザと同じく、表示したら受信確認する
+            return self._post(http, '/check_punishments/ack', json={'cursor': data['cursor']}).status_code == 200
+        return True
+
+    def dashboard(self, http, rng):
+        return self._get(http, '/api/dashboard').status_code == 200
+
+    def index(self, http, rng):
+        return self._get(http, '/').status_code == 200
+
+    def profile(self, http, rng):
+        return self._get(http, '/profile').status_code == 200
+
+    def history(self, http, rng):
+        archived = '1' if rng.random() < 0.5 else '0'
+        return self._get(http, f'/api/history?archived={archived}&limit=20').status_code == 200
+
+    def _add(self, http, deadline):
+        return self._post(http, '/add', data={
+            'task_title': f'soak-{time.monotonic_ns()}',
+            'deadline': deadline.strftime('%Y-%m-%dT%H:%M'),
+            'penalty_text': '期限を守れませんでした。'
+        }).status_code == 200
+
+    def add_task(self, http, rng):
+        return self._add(http, datetime.now() + timedelta(hours=rng.randint(1, 48)))
+
+    def add_overdue_task(self, http, rng):
+        # 分単位で切り捨てられるので、次の締め切りチェックで処刑される
+        return self._add(http, datetime.now() - timedelta(minutes=1))
+
+    def complete_task(self, http, rng):
+        response = self._get(http, '/api/tasks')
+        if response.status_code != 200:
+            return False
+        tasks = [t for t in response.json() if not t['is_completed'] and not t['is_punished']]
+        if not tasks:
+            return True
+        # 未完了が増え続けないよう、多いときは古いものから片付ける
+        task = tasks[0] if len(tasks) > self.max_pending else rng.choice(tasks)
+        return self._post(http, f"/delete/{task['id']}").status_code == 200
+
+    def toggle_group(self, http, rng):
+        response = self._get(http, '/api/groups')
+        if response.status_code != 200:
+            return False
+        groups = response.json()
+        if groups and rng.random() < 0.5:
+            return self._post(http, f"/group/{rng.choice(groups)['id']}/leave").status_code == 200
+        return self._post(http, '/group/join', data={'invite_code': rng.choice(self.invite_codes)}).status_code == 200
+
+
+class Sampler:
+    """一定間隔でプロセスの状態を記録する。tracemalloc の比較は基準のスナップショットとだけ行う"""
+
+    def __init__(self, app_module, connections, users, app_log, top, output=None):
+        self.app_module = app_module
+        self.connections = connections
+        self.users = users
+        self.app_log = app_log
+        self.top = top
+        self.output = output
+        self.samples = []
+        self.baseline_snapshot = None
+        self.started = time.monotonic()
+
+    def _snapshot(self):
+        snapshot = tracemalloc.take_snapshot()
+        return snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+
+    def count_dead_jobs(self):
+        with self.app_module.app.app_context():
+            return self.app_module.DeadJob.query.count()
+
+    def sample(self, set_baseline=False):
+        gc.collect()
+        record = {
+            'elapsed': time.monotonic() - self.started,
+            'rss_mb': read_rss_mb(),
+            'traced_mb': None,
+            'db_open': self.connections.open,
+            'db_checked_out': self.connections.checked_out,
+            'fds': count_fds(),
+            'threads': threading.active_count(),
+            # スレッドが増えたとき、名前ごとの本数から出どころを絞れる
+            'thread_names': dict(Counter(re.sub(r'\d+', 'N', t.name) for t in threading.enumerate())),
+            'requests': sum(self.users.counts.values()),
+            'errors': sum(self.users.errors.values()),
+            'app_errors': self.app_log.error_lines,
+            'dead_jobs': self.count_dead_jobs(),
+            'top': [],
+        }
+        if tracemalloc.is_tracing():
+            record['traced_mb'] = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+            snapshot = self._snapshot()
+            if set_baseline or self.baseline_snapshot is None:
+                self.baseline_snapshot = snapshot
+            else:
+                stats = snapshot.compare_to(self.baseline_snapshot, 'lineno')
+                record['top'] = [{
+                    'where': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                    'size_diff_kb': stat.size_diff / 1024,
+                    'count_diff': stat.count_diff,
+                } for stat in stats[:self.top] if stat.size_diff > 0]
+            del snapshot
+        record['baseline'] = set_baseline
+        self.samples.append(record)
+        if self.output:
+            self.output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.output.flush()
+        return record
+
+
+def format_value(value, fmt):
+    return format(value, fmt) if value is not None else '-'
+
+
+def print_sample(record):
+    top = record['top'][0] if record['top'] else None
+    where = f"  +{top['size_diff_kb']:,.0f}KB {short_path(top['where'])}" if top else ''
+    mark = '*' if record['baseline'] else ' '
+    print(f"{mark}{record['elapsed'] / 60:>8.1f}{format_value(record['rss_mb'], '>10.1f')}"
+          f"{format_value(record['traced_mb'], '>10.1f')}{record['db_open']:>6}"
+          f"{format_value(record['db_checked_out'], '>6')}{format_value(record['fds'], '>6')}"
+          f"{record['threads']:>8}{record['requests']:>10,}{record['errors']:>7,}"
+          f"{record['app_errors']:>7,}{record['dead_jobs']:>5,}{where}")
+
+
+def short_path(where):
+    # site-packages やリポジトリのパスを省いて表示する
+    for marker in ('site-packages' + os.sep, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep):
+        if marker in where:
+            return where.split(marker, 1)[1]
+    return where
+
+
+def slope_per_hour(samples, key):
+    points = [(s['elapsed'], s[key]) for s in samples if s[key] is not None]
+    if len(points) < 2:
+        return None
+    mean_x = statistics.fmean(x for x, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+    if not denominator:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / denominator * 3600
+
+
+def evaluate(samples, args):
+    """基準（ウォームアップ後の最初の計測）と最後の3回の中央値を比べ、(行, 失敗した項目) を返す"""
+    start = next(i for i, s in enumerate(samples) if s['baseline'])
+    measured = samples[start:]
+    baseline, tail = measured[0], measured[-3:]
+    lines, failures = [], []
+    for key, label, unit, threshold_name in METRICS:
+        values = [s[key] for s in tail if s[key] is not None]
+        if baseline[key] is None or not values:
+            lines.append(f"  {label:<10}{'（取得できません）':>20}")
+            continue
+        growth = statistics.median(values) - baseline[key]
+        slope = slope_per_hour(measured, key)
+        limit = getattr(args, threshold_name)
+        failed = limit is not None and growth > limit
+        if failed:
+            failures.append(label)
+        lines.append(f"  {label:<10}{baseline[key]:>10.1f}{statistics.median(values):>10.1f}{growth:>+10.1f} {unit:<4}"
+                     f"{format_value(slope, '>+10.2f')}{format_value(limit, '>10')}  {'NG' if failed else 'OK'}")
+    return lines, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='長時間稼働でのメモリ・接続・スレッドの増加を調べるソークテスト')
+    parser.add_argument('--duration', type=parse_duration, default='30m', help='実行時間（例: 90s, 30m, 12h, 3d）')
+    parser.add_argument('--warmup', type=parse_duration, default=None,
+                        help='基準を取るまでの時間（既定は実行時間の10%%、最大30分）')
+    parser.add_argument('--interval', type=parse_duration, default='60s', help='計測間隔')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=8, help='利用者を動かすスレッド数（同時要求数）')
+    parser.add_argument('--think', type=float, default=0.5, help='操作の間の平均待ち時間（秒）')
+    parser.add_argument('--max-pending', type=int, default=20, help='これを超えたら古い未完了タスクから完了させる')
+    parser.add_argument('--tick', type=float, default=10, help='check_deadlines の実行間隔（本番は10秒）')
+    parser.add_argument('--workers', type=int, default=2, help='ジョブワーカーのスレッド数')
+    parser.add_argument('--archive-every', type=parse_duration, default='5m',
+                        help='archive_finalized_tasks の実行間隔（ARCHIVE_AFTER_DAYS=0 で回す。0 で止める）')
+    parser.add_argument('--latency-ms', type=float, default=50, help='スタブ Webhook の応答遅延')
+    parser.add_argument('--trace-frames', type=int, default=1, help='tracemalloc が記録するフレーム数（0 で無効）')
+    parser.add_argument('--top', type=int, default=10, help='表示する増加の大きい割り当て箇所の数')
+    parser.add_argument('--output', help='計測値を JSON Lines で書き出すファイル')
+    parser.add_argument('--max-rss-growth', type=float, default=64.0, help='RSS の増加の上限（MB）')
+    parser.add_argument('--max-traced-growth', type=float, default=16.0, help='tracemalloc の増加の上限（MB）')
+    parser.add_argument('--max-connection-growth', type=int, default=2, help='開いている DB 接続の増加の上限')
+    parser.add_argument('--max-fd-growth', type=int, default=20, help='ファイル記述子の増加の上限')
+    parser.add_argument('--max-thread-growth', type=int, default=4, help='スレッド数の増加の上限')
+    args = parser.parse_args()
+    if args.warmup is None:
+        args.warmup = min(args.duration * 0.1, 1800)
+    if args.warmup + args.interval > args.duration:
+        parser.error('--duration は --warmup と --interval の合計より長くしてください')
+
+    # APScheduler は設定を変えてから自分で起動する
+    os.environ['SCHEDULER_ENABLED'] = '0'
+    app_module = load_app()
+    app = app_module.app
+    if args.archive_every:
+        app.config['ARCHIVE_AFTER_DAYS'] = 0
+
+    print(f"🌱 データ投入中... (users={args.users})")
+    first_user = seed_scaled(app_module, users=args.users, tasks_per_user=5, groups=10)
+    user_ids = list(range(first_user, first_user + args.users))
+    with app.app_context():
+        invite_codes = [g.invite_code for g in app_module.Group.query.all()]
+        engine = app_module.db.engine
+
+    stub = StubWebhook(args.latency_ms / 1000, 0.0)
+    stub.start()
+    os.environ['DISCORD_WEBHOOK_URL'] = f'{stub.url}/global'
+
+    if args.trace_frames:
+        tracemalloc.start(args.trace_frames)
+
+    # 1要求ごとのアクセスログは標準エラーに出て、長時間だと計測結果が埋もれる
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    server_thread = threading.Thread(target=server.serve_forever, name='soak-server', daemon=True)
+
+    scheduler = app_module.scheduler
+    scheduler.scheduler.reschedule_job('deadline_check_job', trigger='interval', seconds=args.tick)
+    with contextlib.suppress(Exception):
+        scheduler.remove_job('archive_tasks_job')
+    if args.archive_every:
+        scheduler.add_job(id='archive_tasks_job', func=app_module.archive_finalized_tasks,
+                          trigger='interval', seconds=args.archive_every)
+
+    users = SimulatedUsers(base_url, make_sessions(app_module, base_url, user_ids), user_ids, invite_codes,
+                           args.clients, args.think, args.max_pending)
+    stop_event = threading.Event()
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    # 本体のログ（処刑の通知など）は長時間で大量になるので捨て、エラーだけを数える。
+    # リクエスト中の例外は Flask が標準エラーに記録するので、それも同じく数える
+    app_log = AppLog()
+    error_handler = logging.StreamHandler(app_log)
+    error_handler.setLevel(logging.ERROR)
+    error_handler.setFormatter(logging.Formatter('Flask エラー: %(message)s'))
+    app.logger.addHandler(error_handler)
+
+    print(f"🧪 ソークテスト実行中... (duration={args.duration / 60:.0f}分, warmup={args.warmup / 60:.1f}分, "
+          f"interval={args.interval:.0f}s, users={args.users}, clients={args.clients}, "
+          f"tracemalloc={'off' if not args.trace_frames else f'{args.trace_frames} frames'}, "
+          f"rss={'psutil' if psutil else '/proc'})")
+    print("=" * 96)
+    print(f" {'経過 分':>8}{'RSS MB':>10}{'traced MB':>10}{'DB':>6}{'貸出':>6}{'fd':>6}{'threads':>8}"
+          f"{'要求':>10}{'失敗':>7}{'エラー':>7}{'DLQ':>5}  増加が最大の割り当て箇所")
+    print("-" * 96)
+    console = sys.stdout
+    failures = []
+    with ConnectionCounter(engine) as connections:
+        sampler = Sampler(app_module, connections, users, app_log, args.top, output)
+        with contextlib.redirect_stdout(app_log):
+            server_thread.start()
+            scheduler.start()
+            workers = app_module.start_job_workers(args.workers, stop_event)
+            users.start(stop_event)
+
+            started = time.monotonic()
+            baseline_taken = False
+            next_sample = started + args.interval
+            try:
+                while time.monotonic() < started + args.duration:
+                    stop_event.wait(max(0.0, next_sample - time.monotonic()))
+                    next_sample += args.interval
+                    set_baseline = not baseline_taken and time.monotonic() - started >= args.warmup
+                    record = sampler.sample(set_baseline=set_baseline)
+                    with contextlib.redirect_stdout(console):
+                        print_sample(record)
+                    baseline_taken = baseline_taken or set_baseline
+            except KeyboardInterrupt:
+                print("\n⏹️ 中断しました。ここまでの計測で判定します", file=console)
+            finally:
+                stop_event.set()
+                users.join(timeout=30)
+                for worker in workers:
+                    worker.join(timeout=30)
+                scheduler.shutdown(wait=True)
+                server.shutdown()
+                stub.stop()
+                if output:
+                    output.close()
+
+        samples = sampler.samples
+        if not baseline_taken:
+            print("⚠️ ウォームアップ後の計測がないため判定できません")
+            sys.exit(2)
+
+        print("=" * 96)
+        print(f"  {'項目':<10}{'基準':>10}{'最後':>10}{'増加':>10}{'':<5}{'/時間':>10}{'上限':>10}")
+        lines, failures = evaluate(samples, args)
+        for line in lines:
+            print(line)
+
+    last = samples[-1]
+    if last['top']:
+        print("-" * 96)
+        print(f"基準からの増加が大きい割り当て箇所（上位 {args.top}）")
+        for item in last['top']:
+            print(f"  {item['size_diff_kb']:>+10,.1f} KB {item['count_diff']:>+9,} 個  {short_path(item['where'])}")
+    if failures:
+        names = Counter(last['thread_names'])
+        print("-" * 96)
+        print("最後の計測時のスレッド: " + ", ".join(f'{name} x{count}' for name, count in names.most_common()))
+    print("-" * 96)
+    total = sum(users.counts.values())
+    errors = sum(users.errors.values())
+    print(f"要求 {total:,} 回 / 失敗 {errors:,} 回 / Webhook 要求 {stub.requests:,} 回")
+    if errors:
+        print("  失敗の内訳: " + ", ".join(f'{name} {count:,}' for name, count in users.errors.most_common()))
+    # 最後の計測の後（停止処理中）に出たものも含める
+    app_errors, dead_jobs = app_log.error_lines, sampler.count_dead_jobs()
+    print(f"本体のエラー {app_errors:,} 行 / デッドレター {dead_jobs:,} 件")
+    for line in app_log.recent:
+        print(f"  {line}")
+    print("=" * 96)
+    problems = []
+    if failures:
+        problems.append(f"閾値を超えて増えました: {', '.join(failures)}")
+    if app_errors or dead_jobs:
+        problems.append(f"本体のエラー {app_errors:,} 行、デッドレター {dead_jobs:,} 件がありました")
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        sys.exit(1)
+    print("✅ 閾値を超える増加も、本体のエラーもありませんでした")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""完了・処刑済みタスクが増えたときの、よく通るクエリの時間をアーカイブ前後で比較する
+
+ユーザーごとの古い履歴件数を段階的に増やし、各段階で
+    アーカイブ前 : 履歴がすべて tasks に残っている状態
+    アーカイブ後 : archive_finalized_tasks() で tasks_archive に移した後
+の処理時間を測る。アーカイブ後は tasks の大きさが履歴件数によらないので、時間も横ばいになる。
+
+使い方:
+    python benchmarks/bench_task_archive.py --users 500 --history 0,100,400 --iterations 200
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import load_app, seed_scaled
+
+
+def reset_tasks(app_module, user_ids, pending, history):
+    """未完了のタスクを pending 件、ARCHIVE_AFTER_DAYS より古い完了・処刑済みを history 件ずつ入れ直す"""
+    db = app_module.db
+    now = datetime.now()
+    old = now - timedelta(days=app_module.app.config['ARCHIVE_AFTER_DAYS'] + 10)
+    with app_module.app.app_context():
+        db.session.execute(app_module.Task.__table__.delete())
+        db.session.execute(app_module.ArchivedTask.__table__.delete())
+        db.session.execute(app_module.UserStats.__table__.update().values(
+            archived_tasks=0, archived_completed=0, archived_punished=0
+        ))
+        rows = []
+        for uid in user_ids:
+            for j in range(pending):
+                rows.append({
+                    'user_id': uid, 'title': f'課題{j}', 'deadline': now + timedelta(hours=j + 1),
+                    'penalty_text': '期限を守れませんでした。', 'is_punished': False, 'is_completed': False,
+                    'created_at': now - timedelta(minutes=j), 'completed_at': None, 'punished_at': None
+                })
+            for j in range(history):
+                punished = j % 4 == 0
+                rows.append({
+                    'user_id': uid, 'title': f'過去の課題{j}', 'deadline': old - timedelta(hours=j),
+                    'penalty_text': '期限を守れませんでした。', 'is_punished': punished, 'is_completed': not punished,
+                    'created_at': old - timedelta(hours=j + 1),
+                    'completed_at': None if punished else old - timedelta(hours=j),
+                    'punished_at': old - timedelta(hours=j) if punished else None
+                })
+        for start in range(0, len(rows), 20000):
+            db.session.execute(app_module.Task.__table__.insert(), rows[start:start + 20000])
+        db.session.commit()
+        for uid in user_ids:
+            app_module.update_user_stats(uid)
+
+
+def deadline_scan(app_module):
+    # check_deadlines と同じ条件で、期限切れの未処理タスクを探す
+    Task = app_module.Task
+    return Task.query.filter(
+        Task.deadline < datetime.now(),
+        Task.is_punished == False,
+        Task.is_completed == False
+    ).order_by(Task.deadline).all()
+
+
+def measure(app_module, user_ids, iterations):
+    rng = random.Random(0)
+    operations = [
+        ('未完了タスク一覧', lambda uid: app_module.get_pending_task_rows(uid)),
+        ('次の期限の取得', lambda uid: app_module.recommend_punishment_poll(uid)),
+        ('締め切りチェック', lambda uid: deadline_scan(app_module)),
+        ('統計の再計算', lambda uid: app_module.update_user_stats(uid)),
+    ]
+    results = {}
+    with app_module.app.app_context():
+        for label, operation in operations:
+            operation(user_ids[0])  # ウォームアップ
+            started = time.perf_counter()
+            for _ in range(iterations):
+                operation(rng.choice(user_ids))
+            results[label] = (time.perf_counter() - started) / iterations * 1000
+            app_module.db.session.rollback()
+        stats = app_module.get_user_stats(user_ids[0]).to_dict()
+    return results, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='タスクのアーカイブによるクエリ時間のベンチマーク')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--pending', type=int, default=10, help='ユーザーあたりの未完了タスク数')
+    parser.add_argument('--history', default='0,100,400', help='ユーザーあたりの古い履歴件数（カンマ区切り）')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    app_module.app.config['ARCHIVE_BATCH_PAUSE'] = 0
+    print(f"🌱 データ投入中... (users={args.users})")
+    first_user = seed_scaled(app_module, users=args.users, tasks_per_user=1, groups=10)
+    user_ids = list(range(first_user, first_user + args.users))
+
+    print("=" * 84)
+    print(f"{'履歴/人':>8}{'tasks 行数':>12}  {'処理':<16}{'アーカイブ前 ms':>16}{'アーカイブ後 ms':>16}")
+    print("-" * 84)
+    for history in [int(n) for n in args.history.split(',')]:
+        reset_tasks(app_module, user_ids, args.pending, history)
+        total = args.users * (args.pending + history)
+        before, stats_before = measure(app_module, user_ids, args.iterations)
+
+        started = time.perf_counter()
+        moved = app_module.archive_finalized_tasks()
+        elapsed = time.perf_counter() - started
+
+        after, stats_after = measure(app_module, user_ids, args.iterations)
+        for label in before:
+            print(f"{history:>8}{total:>12,}  {label:<16}{before[label]:>16.3f}{after[label]:>16.3f}")
+        rate = moved / elapsed if elapsed else 0
+        print(f"{'':>22}アーカイブ {moved:,} 件 / {elapsed:.2f} 秒 ({rate:,.0f} 件/秒)"
+              f"  統計一致: {'OK' if stats_before == stats_after else 'NG'}")
+        print("-" * 84)
+
+
+if __name__ == '__main__':
+    main()
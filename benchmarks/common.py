@@ -0,0 +1,85 @@
+"""ベンチマーク共通処理: 一時 DB で app を読み込み、指定した規模のデータを投入する"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def load_app(db_path=None):
+    """本番 DB を汚さないよう、一時ファイルの SQLite を指定してから app を import する"""
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='sg-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    import app as app_module
+    if app_module.scheduler.running:
+        app_module.scheduler.shutdown(wait=False)
+    with app_module.app.app_context():
+        app_module.db.create_all()
+    return app_module
+
+
+def seed_scaled(app_module, users=1000, tasks_per_user=20, groups=50, now=None):
+    """ユーザー・統計・タスク・グループを一括投入し、最初のユーザーの id を返す"""
+    from werkzeug.security import generate_password_hash
+
+    now = now or datetime.now()
+    db = app_module.db
+    password_hash = generate_password_hash('password123')
+
+    with app_module.app.app_context():
+        db.session.execute(app_module.User.__table__.insert(), [{
+            'username': f'bench_user_{i}',
+            'display_name': f'ベンチ利用者{i}',
+            'password_hash': password_hash,
+            'created_at': now,
+            'punish_seq': 0,
+            'punish_ack_seq': 0
+        } for i in range(users)])
+        user_ids = [row[0] for row in db.session.query(app_module.User.id).order_by(app_module.User.id)]
+
+        db.session.execute(app_module.UserStats.__table__.insert(), [{
+            'user_id': uid,
+            'total_tasks': tasks_per_user,
+            'completed_tasks': (uid * 7) % (tasks_per_user + 1),
+            'punished_tasks': (uid * 3) % (tasks_per_user + 1),
+            'laziness_score': ((uid * 37) % 1000) / 10,
+            'current_streak': uid % 10,
+            'max_streak': uid % 15,
+            'last_activity': now
+        } for uid in user_ids])
+
+        task_rows = []
+        for uid in user_ids:
+            for j in range(tasks_per_user):
+                task_rows.append({
+                    'user_id': uid,
+                    'title': f'課題{j}のレポートを提出する',
+                    'deadline': now + timedelta(hours=j + 1),
+                    'penalty_text': '期限を守れませんでした。次こそは必ず守ります。',
+                    'is_punished': False,
+                    'is_completed': j % 3 == 0,
+                    'created_at': now - timedelta(minutes=j)
+                })
+        db.session.execute(app_module.Task.__table__.insert(), task_rows)
+
+        db.session.execute(app_module.Group.__table__.insert(), [{
+            'name': f'ベンチグループ{g}',
+            'invite_code': f'B{g:05d}',
+            'created_by': user_ids[g % len(user_ids)],
+            'created_at': now
+        } for g in range(groups)])
+        group_ids = [row[0] for row in db.session.query(app_module.Group.id).order_by(app_module.Group.id)]
+        if group_ids:
+            db.session.execute(app_module.GroupMember.__table__.insert(), [{
+                'group_id': group_ids[i % len(group_ids)],
+                'user_id': uid,
+                'joined_at': now
+            } for i, uid in enumerate(user_ids)])
+
+        db.session.commit()
+        return user_ids[0]
@@ -0,0 +1,136 @@
+"""static/ の CSS と JavaScript を、内容ハッシュ付きのファイル名で static/dist/ に書き出す
+
+使い方:
+    python build_assets.py
+
+出力:
+    static/dist/style.<hash>.css      最小化したファイル
+    static/dist/style.<hash>.css.gz   gzip 済み（nginx の gzip_static でそのまま返せる）
+    static/dist/style.<hash>.css.br   brotli 済み（brotli パッケージがある場合）
+    static/dist/manifest.json         元のファイル名 -> ハッシュ付きファイル名
+
+STATIC_FINGERPRINT=1（gunicorn.conf.py の既定）のとき、app.py は manifest.json があれば
+url_for('static', ...) をハッシュ付きのファイル名に置き換える。元のファイルの方が新しければ使わない。
+ファイル名が内容で変わるので、ブラウザには1年間・immutable でキャッシュさせてよい。
+gunicorn.conf.py は起動時にこのスクリプトを実行する。
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+
+# 本格的な最小化ライブラリは、インストールされていれば使う
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+ASSETS = ('style.css', 'script.js')
+
+
+def minify_css(source):
+    if rcssmin is not None:
+        return rcssmin.cssmin(source)
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r'\s*:\s*(?=[^{}]*;)', ':', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+    # 文字列やテンプレートリテラルを壊さないよう、行頭の字下げ・行だけのコメント・空行を削るだけにする
+    lines = []
+    for line in source.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('//'):
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def write_file(path, data):
+    # 生成物を同じ名前で途中まで書いた状態を見せないよう、一時ファイルから置き換える
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_asset(name):
+    base, ext = os.path.splitext(name)
+    with open(os.path.join(STATIC_DIR, name), encoding='utf-8') as f:
+        source = f.read()
+    data = MINIFIERS[ext](source).encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    filename = f'{base}.{digest}{ext}'
+    path = os.path.join(DIST_DIR, filename)
+
+    if not os.path.exists(path):
+        write_file(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            write_file(path + '.br', brotli.compress(data, quality=11))
+        # 本体は最後に書き、圧縮版が揃ってからマニフェストで参照されるようにする
+        write_file(path, data)
+    return f'dist/{filename}', len(source.encode('utf-8')), len(data)
+
+
+def remove_stale(manifest):
+    current = {os.path.basename(path) for path in manifest.values()}
+    for filename in os.listdir(DIST_DIR):
+        if filename == MANIFEST_NAME:
+            continue
+        base = filename
+        for suffix in ('.gz', '.br'):
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        if base not in current:
+            os.remove(os.path.join(DIST_DIR, filename))
+
+
+def build(keep_old=True):
+    """アセットを書き出してマニフェストを返す。keep_old=False なら古いハッシュのファイルを消す"""
+    os.makedirs(DIST_DIR, exist_ok=True)
+    manifest = {}
+    for name in ASSETS:
+        hashed, original_size, minified_size = build_asset(name)
+        manifest[name] = hashed
+        print(f"📦 {name} -> {hashed} ({original_size:,} -> {minified_size:,} bytes)")
+    if not keep_old:
+        remove_stale(manifest)
+    write_file(os.path.join(DIST_DIR, MANIFEST_NAME),
+               json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+    return manifest
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='静的ファイルをハッシュ付きで書き出します')
+    parser.add_argument('--clean', action='store_true',
+                        help='マニフェストから外れた古いファイルを消す（配信中の古いページが参照していない場合のみ）')
+    args = parser.parse_args()
+    build(keep_old=not args.clean)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+# cache.py - ホットな読み取り結果のキャッシュ
+#
+# プロセス内 LRU を一次キャッシュとし、設定すればプロセス間で共有する二次キャッシュ
+# （SQLite ファイル、または Redis 互換サーバー）を重ねる。
+# 無効化はタグ単位。タグのバージョン番号を上げると、そのタグ付きで保存した
+# エントリはすべて読み出し時に不一致となり失効する。
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+MISSING = object()
+
+
+class LRUBackend:
+    """スレッドセーフなプロセス内 LRU（TTL 付き）"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_unlocked(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._get_unlocked(key)
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteBackend:
+    """複数プロセスで共有できる SQLite ファイルのキャッシュ"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_entries '
+                     '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_counters '
+                     '(key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def _conn(self):
+        # sqlite3 の接続はスレッドをまたげないため、スレッドごとに持つ
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value, expires_at FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)',
+                     (key, pickle.dumps(value), expires_at))
+        # 期限切れ行はときどきまとめて掃除する
+        if zlib.crc32(key.encode()) % 64 == int(time.time()) % 64:
+            conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (time.time(),))
+
+    def add(self, key, value, ttl=None):
+        """キーが無い（または期限切れの）ときだけ書き込み、書き込めたら True"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute('DELETE FROM cache_entries WHERE key = ? AND expires_at <= ?', (key, now))
+        cursor = conn.execute('INSERT OR IGNORE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)',
+                              (key, pickle.dumps(value), now + ttl if ttl else None))
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def incr(self, key):
+        conn = self._conn()
+        conn.execute('INSERT INTO cache_counters (key, value) VALUES (?, 1) '
+                     'ON CONFLICT(key) DO UPDATE SET value = value + 1', (key,))
+        return self.get_counter(key)
+
+    def get_counter(self, key):
+        row = self._conn().execute('SELECT value FROM cache_counters WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute('DELETE FROM cache_entries')
+        conn.execute('DELETE FROM cache_counters')
+
+
+class RedisBackend:
+    """Redis 互換サーバーを共有キャッシュとして使う（redis パッケージが必要）"""
+
+    def __init__(self, url, prefix='sg:'):
+        if redis is None:
+            raise RuntimeError('CACHE_BACKEND=redis には redis パッケージが必要です')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(self.prefix + key, pickle.dumps(value), nx=True,
+                                    px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + 'counter:' + key)
+
+    def get_counter(self, key):
+        return int(self.client.get(self.prefix + 'counter:' + key) or 0)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class Cache:
+    """プロセス内 LRU + 任意の共有キャッシュ。タグ無効化とスタンピード防止付き"""
+
+    def __init__(self, shared=None, max_entries=1024, tag_sync_interval=1.0, lock_timeout=5.0):
+        self.local = LRUBackend(max_entries)
+        self.shared = shared
+        # 共有タグのバージョンを読み直す間隔。他プロセスでの無効化はこの秒数以内に反映される
+        self.tag_sync_interval = tag_sync_interval
+        self.lock_timeout = lock_timeout
+        self._tag_versions = {}
+        self._tag_lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(64)]
+
+    def _tag_version(self, tag):
+        now = time.monotonic()
+        with self._tag_lock:
+            cached = self._tag_versions.get(tag)
+            if cached is not None and (self.shared is None or now - cached[1] < self.tag_sync_interval):
+                return cached[0]
+        if self.shared is None:
+            return 0
+        version = self.shared.get_counter('tag:' + tag)
+        with self._tag_lock:
+            self._tag_versions[tag] = (version, now)
+        return version
+
+    def _snapshot(self, tags):
+        return {tag: self._tag_version(tag) for tag in tags}
+
+    def _is_fresh(self, entry):
+        return all(self._tag_version(tag) == version for tag, version in entry['tags'].items())
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is not None and self._is_fresh(entry):
+            return entry['value']
+        if self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None and self._is_fresh(entry):
+                remaining = entry['expires_at'] - time.time()
+                if remaining > 0:
+                    self.local.set(key, entry, remaining)
+                    return entry['value']
+        return MISSING
+
+    def set(self, key, value, ttl, tags=(), versions=None):
+        entry = {
+            'value': value,
+            'tags': versions if versions is not None else self._snapshot(tags),
+            'expires_at': time.time() + ttl
+        }
+        self.local.set(key, entry, ttl)
+        if self.shared is not None:
+            self.shared.set(key, entry, ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def invalidate_tags(self, *tags):
+        now = time.monotonic()
+        for tag in tags:
+            if self.shared is not None:
+                version = self.shared.incr('tag:' + tag)
+            else:
+                version = self._tag_version(tag) + 1
+            with self._tag_lock:
+                self._tag_versions[tag] = (version, now)
+
+    def get_or_set(self, key, compute, ttl, tags=()):
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+
+        # 同じキーの再計算は同一プロセス内で1回に絞る
+        with self._key_locks[hash(key) % len(self._key_locks)]:
+            value = self.get(key)
+            if value is not MISSING:
+                return value
+
+            lock_key = 'lock:' + key
+            acquired = self.shared is None or self.shared.add(lock_key, os.getpid(), self.lock_timeout)
+            if not acquired:
+                # 他プロセスが計算中なので、結果が共有キャッシュに入るのを待つ
+                deadline = time.monotonic() + self.lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    value = self.get(key)
+                    if value is not MISSING:
+                        return value
+                # 待ちきれなければ自分で計算する
+
+            try:
+                # 計算中に無効化された場合に古い値を新しい版として保存しないよう、先に版を取る
+                versions = self._snapshot(tags)
+                value = compute()
+                self.set(key, value, ttl, versions=versions)
+                return value
+            finally:
+                if acquired and self.shared is not None:
+                    self.shared.delete(lock_key)
+
+    def clear(self):
+        self.local.clear()
+        with self._tag_lock:
+            self._tag_versions.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+
+def create_cache(config):
+    """CACHE_BACKEND（local / sqlite / redis）と CACHE_URL から Cache を作る"""
+    backend = config.get('CACHE_BACKEND', 'local')
+    url = config.get('CACHE_URL')
+    max_entries = config.get('CACHE_MAX_ENTRIES', 1024)
+
+    if backend == 'sqlite':
+        shared = SQLiteBackend(url or 'instance/cache.sqlite3')
+    elif backend == 'redis':
+        shared = RedisBackend(url or 'redis://localhost:6379/0')
+    elif backend == 'local':
+        shared = None
+    else:
+        raise ValueError(f'不明な CACHE_BACKEND です: {backend}')
+    return Cache(shared=shared, max_entries=max_entries)
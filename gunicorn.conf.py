@@ -0,0 +1,134 @@
+# gunicorn.conf.py - 本番用の起動設定
+#
+# 起動:
+#     gunicorn -c gunicorn.conf.py app:app
+#     （どのディレクトリから起動しても、このファイルの場所をアプリのディレクトリとして使う）
+#
+# 構成:
+#   - Web ワーカー（gunicorn）はリクエスト処理だけを行い、スケジューラもジョブも動かさない
+#   - 締め切りチェックのスケジューラとジョブワーカーは、gunicorn のマスターが起動する
+#     サイドカープロセス（worker.py と同じ処理）で1つだけ動かす。
+#     サイドカーが落ちたらマスターのログに終了コードを出し、1秒から最大60秒まで間隔を倍にしながら
+#     起動し直す（60秒以上動いていれば間隔は1秒に戻る）。
+#     SIDECAR_WORKER=0 のときは、python worker.py --with-scheduler を systemd などの
+#     プロセス監視の下で別に動かすこと（落ちても誰も起動し直さない）
+#   - 起動時に build_assets.py で静的ファイルをハッシュ付きで書き出す。
+#     static/ は nginx から直接返し、Python のワーカーには届かないようにする（nginx.conf）
+#   - 停止時（SIGTERM）は Web ワーカーの処理中リクエストを待ち、最後にサイドカーを止めて
+#     実行中の締め切りチェックとジョブを終わらせてから終了する
+#
+# 環境変数:
+#   BIND                 待ち受けアドレス（既定 0.0.0.0:8000）
+#   WEB_WORKERS          Web ワーカー数（既定 CPU 数 * 2 + 1）
+#   WORKER_CLASS         gthread（既定）または gevent（pip install gevent が必要）
+#   WEB_THREADS          gthread のワーカーあたりスレッド数（既定 8）
+#   WORKER_CONNECTIONS   gevent のワーカーあたり同時接続数（既定 1000）
+#   KEEPALIVE            Keep-Alive 秒数（既定 20。ポーリング間隔より長くして接続を使い回す）
+#   GRACEFUL_TIMEOUT     停止時に処理中リクエストとサイドカーを待つ秒数（既定 30）
+#   SIDECAR_WORKER       0 にするとサイドカーを起動しない（python worker.py を別ホストで動かす場合）
+#   SIDECAR_THREADS      サイドカーのジョブワーカースレッド数（既定 4）
+#   CACHE_BACKEND        既定 sqlite。統計の再計算とキャッシュの無効化はサイドカーで行われるので、
+#                        local（プロセス内のみ）にすると Web ワーカーは TTL が切れるまで古いランキングや
+#                        /api/stats を返す。Redis があれば redis（CACHE_URL で接続先を指定）
+#
+# 目安（benchmarks/bench_dashboard_tabs.py、1 vCPU に負荷生成側も同居、SQLite、1000 ユーザー）:
+#   1タブ 0.43 req/s の固定間隔（/check_punishments 3秒 + /api/dashboard 10秒）で測った値。
+#   現在のクライアントは X-Poll-Interval に従うため、何も起きていないタブは約 0.033 req/s
+#   （100 タブで固定間隔の旧クライアント 70 req/s → 3.3 req/s）で、同じ構成でより多くのタブを持てる。
+#   gthread 3 ワーカー x 8 スレッド: 200 タブ（87 req/s）で p95 30ms、250 タブで p95 715ms
+#   gevent  3 ワーカー            : 250 タブ（108 req/s）で p95 33ms、300 タブで p95 581ms
+#   どちらも約 110〜130 req/s で CPU が飽和するので、それ以上は CPU かノードを増やす。
+
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# app:app の import も、このファイルの場所を基準にする
+chdir = ROOT
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.getenv('WORKER_CLASS', 'gthread')
+threads = int(os.getenv('WEB_THREADS', '8'))
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', '1000'))
+keepalive = int(os.getenv('KEEPALIVE', '20'))
+timeout = int(os.getenv('WORKER_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
+# メモリの増加に備え、一定数のリクエストごとにワーカーを入れ替える（0 で無効）
+max_requests = int(os.getenv('MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', '0'))
+accesslog = os.getenv('ACCESS_LOG') or None
+errorlog = '-'
+
+# Web ワーカーではスケジューラと内蔵ジョブワーカーを動かさない（ワーカー数だけ重複するため）
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['JOB_WORKERS'] = '0'
+# サイドカーでの無効化が Web ワーカーに届くよう、プロセス間で共有するキャッシュを使う
+os.environ.setdefault('CACHE_BACKEND', 'sqlite')
+# 起動時に書き出したハッシュ付きの静的ファイルを使う（app.py の既定は開発向けに無効）
+os.environ.setdefault('STATIC_FINGERPRINT', '1')
+
+_sidecar = None
+_stopping = threading.Event()
+
+SIDECAR_MIN_BACKOFF = 1
+SIDECAR_MAX_BACKOFF = 60
+
+
+def _start_sidecar():
+    return subprocess.Popen([
+        sys.executable, os.path.join(ROOT, 'worker.py'),
+        '--threads', os.getenv('SIDECAR_THREADS', '4'),
+        '--with-scheduler'
+    ], cwd=ROOT)
+
+
+def _supervise_sidecar(server):
+    # サイドカーが止まると締め切りチェックもジョブも止まるので、落ちたら間隔を空けて起動し直す
+    global _sidecar
+    backoff = SIDECAR_MIN_BACKOFF
+    while not _stopping.is_set():
+        started = time.monotonic()
+        try:
+            _sidecar = _start_sidecar()
+        except OSError as e:
+            server.log.error('サイドカーを起動できませんでした: %s', e)
+        else:
+            server.log.info('スケジューラ／ジョブワーカーのサイドカーを起動しました (pid=%s)', _sidecar.pid)
+            returncode = _sidecar.wait()
+            if _stopping.is_set():
+                return
+            server.log.error('サイドカーが終了しました (pid=%s, 終了コード=%s)', _sidecar.pid, returncode)
+        if time.monotonic() - started >= SIDECAR_MAX_BACKOFF:
+            backoff = SIDECAR_MIN_BACKOFF
+        server.log.warning('%s秒後にサイドカーを起動し直します', backoff)
+        if _stopping.wait(backoff):
+            return
+        backoff = min(backoff * 2, SIDECAR_MAX_BACKOFF)
+
+
+def on_starting(server):
+    # multiprocessing ではなく別プログラムとして起動し、fork される Web ワーカーに子プロセスの情報を残さない
+    # Web ワーカーが app を import する前にマニフェストを作っておく
+    subprocess.run([sys.executable, os.path.join(ROOT, 'build_assets.py')], cwd=ROOT, check=True)
+    subprocess.run([sys.executable, '-c', 'import worker; worker.initialize_database()'], cwd=ROOT, check=True)
+
+    if os.getenv('SIDECAR_WORKER', '1') != '1':
+        return
+    threading.Thread(target=_supervise_sidecar, args=(server,), name='sidecar-monitor', daemon=True).start()
+
+
+def on_exit(server):
+    _stopping.set()
+    if _sidecar is None or _sidecar.poll() is not None:
+        return
+    server.log.info('サイドカーを停止しています（実行中の処理を待ちます）')
+    _sidecar.terminate()
+    try:
+        _sidecar.wait(graceful_timeout)
+    except subprocess.TimeoutExpired:
+        _sidecar.kill()
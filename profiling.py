@@ -0,0 +1,276 @@
+# profiling.py - 必要なときだけ有効にするリクエスト単位のプロファイラ
+#
+# 対象の決め方:
+#   - PROFILE_ENABLED=1 のとき、PROFILE_ENDPOINTS に含まれるルート（空なら全ルート）の
+#     リクエストを PROFILE_SAMPLE_RATE の割合で記録する
+#   - 管理者が発行した署名付きトークンを X-Profile-Token ヘッダに付けたリクエストは必ず記録する
+#   - check_deadlines の実行も PROFILE_DEADLINES=1 なら同じ割合で記録する
+#
+# 出力（PROFILE_DIR）:
+#   PROFILE_MODE=sample   : スタックのサンプリング結果を折りたたみ形式（.folded）で保存。
+#                           flamegraph.pl や speedscope にそのまま読み込める
+#   PROFILE_MODE=cprofile : cProfile の結果（.prof）を保存。snakeviz などで開く。
+#                           同時に記録できるのは1件だけなので、重なった分は sample で記録する
+#   どちらも同名の .json に経過時間などのメタデータを書く
+
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from flask import g, request
+from itsdangerous import BadSignature, TimestampSigner
+
+TOKEN_HEADER = 'X-Profile-Token'
+TOKEN_SALT = 'profile-token'
+
+# cProfile はプロセス内で同時に1つしか有効にできない（3.12 以降は2つ目で ValueError）。
+# 使用中に始まった記録はスタックのサンプリングに切り替える
+_cprofile_lock = threading.Lock()
+
+
+class StackSampler:
+    """別スレッドから対象スレッドのスタックを一定間隔で読み取り、折りたたみ形式で集計する"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+
+class Capture:
+    def __init__(self, name, mode, interval):
+        self.name = name
+        self.mode = mode
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        if mode == 'cprofile' and self._enable_cprofile():
+            return
+        self.mode = 'sample'
+        self._profiler = StackSampler(threading.get_ident(), interval)
+        self._profiler.start()
+
+    def _enable_cprofile(self):
+        if not _cprofile_lock.acquire(blocking=False):
+            return False
+        try:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        except ValueError as e:
+            # デバッガなど別のツールが sys.monitoring を使っている
+            _cprofile_lock.release()
+            print(f"cProfile 開始エラー（サンプリングに切り替えます）: {e}")
+            return False
+        return True
+
+    def stop(self):
+        if self.mode == 'cprofile':
+            try:
+                self._profiler.disable()
+            finally:
+                _cprofile_lock.release()
+            return None
+        return self._profiler.stop()
+
+    def finish(self, directory, extra=None):
+        duration_ms = (time.perf_counter() - self._start) * 1000
+        capture_id = f"{self.started_at.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        counts = self.stop()
+        os.makedirs(directory, exist_ok=True)
+
+        if self.mode == 'cprofile':
+            filename = f'{capture_id}.prof'
+            self._profiler.dump_stats(os.path.join(directory, filename))
+        else:
+            filename = f'{capture_id}.folded'
+            with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+                for stack, count in sorted(counts.items()):
+                    f.write(f'{stack} {count}\n')
+
+        meta = {
+            'id': capture_id,
+            'name': self.name,
+            'file': filename,
+            'mode': self.mode,
+            'duration_ms': round(duration_ms, 2),
+            'started_at': self.started_at.isoformat(),
+            'pid': os.getpid(),
+        }
+        meta.update(extra or {})
+        with open(os.path.join(directory, f'{capture_id}.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return meta
+
+
+class Profiler:
+    def __init__(self, app=None):
+        self.app = app
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        config.setdefault('PROFILE_ENABLED', False)
+        config.setdefault('PROFILE_SAMPLE_RATE', 0.01)
+        config.setdefault('PROFILE_ENDPOINTS', [])
+        config.setdefault('PROFILE_MODE', 'sample')
+        config.setdefault('PROFILE_INTERVAL_MS', 5)
+        config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+        config.setdefault('PROFILE_KEEP', 200)
+        config.setdefault('PROFILE_DEADLINES', False)
+        config.setdefault('PROFILE_TOKEN_MAX_AGE', 3600)
+
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    @property
+    def directory(self):
+        return self.app.config['PROFILE_DIR']
+
+    def _sampled(self):
+        config = self.app.config
+        return config['PROFILE_ENABLED'] and random.random() < config['PROFILE_SAMPLE_RATE']
+
+    def _start(self, name):
+        # 記録を始められなくても、対象のリクエストや処理は止めない
+        config = self.app.config
+        try:
+            return Capture(name, config['PROFILE_MODE'], config['PROFILE_INTERVAL_MS'] / 1000)
+        except Exception as e:
+            print(f"プロファイル開始エラー: {e}")
+            return None
+
+    # --- 署名付きトークン ---
+
+    def _signer(self):
+        return TimestampSigner(self.app.secret_key, salt=TOKEN_SALT)
+
+    def issue_token(self, username):
+        return self._signer().sign(username).decode('utf-8')
+
+    def verify_token(self, token):
+        try:
+            return self._signer().unsign(token, max_age=self.app.config['PROFILE_TOKEN_MAX_AGE']).decode('utf-8')
+        except BadSignature:
+            return None
+
+    # --- リクエストの記録 ---
+
+    def _before_request(self):
+        forced_by = None
+        token = request.headers.get(TOKEN_HEADER)
+        if token:
+            forced_by = self.verify_token(token)
+
+        if not forced_by:
+            endpoints = self.app.config['PROFILE_ENDPOINTS']
+            if endpoints and request.endpoint not in endpoints:
+                return
+            if not self._sampled():
+                return
+
+        capture = self._start(request.endpoint or request.path)
+        if capture is not None:
+            g._profile_capture = capture
+            g._profile_forced_by = forced_by
+
+    def _teardown_request(self, exc):
+        capture = g.pop('_profile_capture', None)
+        if capture is None:
+            return
+        try:
+            capture.finish(self.directory, {
+                'method': request.method,
+                'path': request.path,
+                'requested_by': g.pop('_profile_forced_by', None),
+                'error': repr(exc) if exc else None,
+            })
+            self.prune()
+        except Exception as e:
+            print(f"プロファイル保存エラー: {e}")
+
+    @contextmanager
+    def _capture_block(self, name):
+        capture = self._start(name)
+        try:
+            yield
+        finally:
+            if capture is not None:
+                try:
+                    capture.finish(self.directory)
+                    self.prune()
+                except Exception as e:
+                    print(f"プロファイル保存エラー: {e}")
+
+    def job(self, name):
+        """スケジューラなどリクエスト外の処理を、設定に応じて記録するコンテキストマネージャ"""
+        if self.app.config['PROFILE_DEADLINES'] and self._sampled():
+            return self._capture_block(name)
+        return nullcontext()
+
+    # --- 一覧・掃除 ---
+
+    def _load_metas(self):
+        if not os.path.isdir(self.directory):
+            return []
+        metas = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), encoding='utf-8') as f:
+                    metas.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return metas
+
+    def slowest(self, limit=20, name=None):
+        metas = self._load_metas()
+        if name:
+            metas = [m for m in metas if m.get('name') == name]
+        metas.sort(key=lambda m: m.get('duration_ms', 0), reverse=True)
+        return metas[:limit]
+
+    def prune(self):
+        # 古いものから消して PROFILE_KEEP 件に収める
+        metas = self._load_metas()
+        excess = len(metas) - self.app.config['PROFILE_KEEP']
+        if excess <= 0:
+            return
+        metas.sort(key=lambda m: m.get('started_at', ''))
+        for meta in metas[:excess]:
+            for filename in (meta['file'], f"{meta['id']}.json"):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
@@ -1,6 +1,7 @@
 // static/script.js - 改善版
 
-let processedPunishments = new Set();
+let punishmentCursor = null;
+let rankingPoller = null;
 
 document.addEventListener('DOMContentLoaded', function() {
     const modal = document.getElementById('addTaskModal');
@@ -22,18 +23,97 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
-    renderTaskList();
-    updateStats();
-    loadRankings();
-    loadBadges();
-    loadGroups();
+    // グループ名をインラインの onclick に埋め込まないよう、ボタンの data 属性から読む
+    document.addEventListener('click', function(event) {
+        const button = event.target.closest('.btn-view-ranking');
+        if (button) {
+            showGroupRanking(Number(button.dataset.groupId), button.dataset.groupName);
+        }
+    });
 
-    setInterval(checkForPunishments, 3000);
-    setInterval(updateStats, 5000);
-    setInterval(refreshTaskList, 10000);
-    setInterval(loadRankings, 15000);
+    // 各ポーリングの次回実行はサーバーの X-Poll-Interval に従う
+    const initialPoll = window.INITIAL_POLL || {};
+    const punishmentPoller = createPoller(checkForPunishments, 10000);
+    const dashboardPoller = createPoller(loadDashboard, 60000);
+    rankingPoller = createPoller(loadRankings, 30000);
+
+    // サーバーが埋め込んだデータで初期表示し、以降は /api/dashboard 1本で更新する
+    if (window.INITIAL_DASHBOARD) {
+        markServerRendered(window.INITIAL_DASHBOARD);
+        applyDashboard(window.INITIAL_DASHBOARD);
+        dashboardPoller.start((initialPoll.dashboard || 60) * 1000);
+    } else {
+        dashboardPoller.runNow();
+    }
+    punishmentPoller.start((initialPoll.punishments || 3) * 1000);
 });
 
+// ===== ポーリング =====
+const POLL_MAX_BACKOFF = 5 * 60 * 1000;
+
+// task は fetch の Response を返す Promise。失敗時は指数的に間隔を延ばし、
+// タブが非表示の間は止めて、表示に戻ったらすぐに1回実行する
+function createPoller(task, defaultDelay) {
+    let timer = null;
+    let running = false;
+    let stopped = true;  // start / runNow を呼ぶまでは動かさない
+    let failures = 0;
+
+    function schedule(delay) {
+        clearTimeout(timer);
+        timer = null;
+        if (stopped || document.hidden) return;
+        timer = setTimeout(run, delay);
+    }
+
+    function run() {
+        if (running) return;
+        clearTimeout(timer);
+        timer = null;
+        running = true;
+        task()
+            .then(response => {
+                failures = 0;
+                const recommended = response ? parseFloat(response.headers.get('X-Poll-Interval')) : NaN;
+                schedule(recommended > 0 ? recommended * 1000 : defaultDelay);
+            })
+            .catch(error => {
+                failures += 1;
+                console.error('ポーリングエラー:', error);
+                schedule(Math.min(defaultDelay * Math.pow(2, failures), POLL_MAX_BACKOFF));
+            })
+            .finally(() => {
+                running = false;
+            });
+    }
+
+    document.addEventListener('visibilitychange', function() {
+        if (stopped) return;
+        if (document.hidden) {
+            clearTimeout(timer);
+            timer = null;
+        } else {
+            run();
+        }
+    });
+
+    return {
+        start: function(delay) {
+            stopped = false;
+            schedule(delay);
+        },
+        stop: function() {
+            stopped = true;
+            clearTimeout(timer);
+            timer = null;
+        },
+        runNow: function() {
+            stopped = false;
+            run();
+        }
+    };
+}
+
 // ===== タブ切り替え =====
 function switchTab(tabName) {
     const tabs = document.querySelectorAll('.tab-content');
@@ -44,87 +124,149 @@ function switchTab(tabName) {
     
     document.getElementById(tabName + '-tab').classList.add('active');
     event.target.classList.add('active');
+
+    // 全体ランキングはダッシュボードに含めず、タブを開いている間だけ読み込む
+    if (rankingPoller) {
+        if (tabName === 'ranking') {
+            rankingPoller.runNow();
+        } else {
+            rankingPoller.stop();
+        }
+    }
+}
+
+// ===== ダッシュボード =====
+let lastRendered = {};
+
+// fetch して JSON を handler に渡し、ポーラーがヘッダを読めるよう Response を返す
+function fetchJson(url, handler) {
+    return fetch(url).then(response => {
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        return response.json().then(data => {
+            handler(data);
+            return response;
+        });
+    });
+}
+
+function loadDashboard() {
+    return fetchJson('/api/dashboard', applyDashboard);
+}
+
+function applyDashboard(dashboard) {
+    if (!dashboard || typeof dashboard !== 'object') return;
+
+    renderIfChanged('tasks', dashboard.tasks, renderTasks);
+    renderIfChanged('stats', { stats: dashboard.stats, rank: dashboard.rank }, data => renderStats(data.stats, data.rank));
+    renderIfChanged('badges', dashboard.badges, renderBadges);
+    renderIfChanged('groups', dashboard.groups, renderGroups);
+    showOnce(dashboard.praises, 'shownPraises');
+    showOnce(dashboard.unlocked_badges, 'shownBadges');
+}
+
+// 完了時の褒め言葉やバッジ解除はワーカーが作るので、届いたものを一度だけ表示する
+function showOnce(notices, storageKey) {
+    if (!Array.isArray(notices)) return;
+
+    const shown = new Set(JSON.parse(sessionStorage.getItem(storageKey) || '[]'));
+    notices.forEach(notice => {
+        if (shown.has(notice.id)) return;
+        shown.add(notice.id);
+        showFlash(notice.message, 'success');
+    });
+    sessionStorage.setItem(storageKey, JSON.stringify([...shown]));
+}
+
+// 統計・バッジ・グループはサーバーが HTML を描画済みなので、同じデータでは描き直さない
+function markServerRendered(dashboard) {
+    lastRendered.stats = JSON.stringify({ stats: dashboard.stats, rank: dashboard.rank });
+    lastRendered.badges = JSON.stringify(dashboard.badges);
+    lastRendered.groups = JSON.stringify(dashboard.groups);
+}
+
+// 内容が変わっていないセクションは DOM を書き換えない（開いているグループランキング等を保持する）
+function renderIfChanged(key, data, render) {
+    const serialized = JSON.stringify(data);
+    if (lastRendered[key] === serialized) return;
+    lastRendered[key] = serialized;
+    render(data);
 }
 
 // ===== タスク管理 =====
-function renderTaskList() {
+function renderTasks(tasks) {
     const taskList = document.getElementById('taskList');
-    
-    fetch('/api/tasks')
-        .then(response => {
-            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-            return response.json();
-        })
-        .then(tasks => {
-            if (!Array.isArray(tasks) || tasks.length === 0) {
-                taskList.innerHTML = '<li class="no-task">現在、タスクはありません。</li>';
-                return;
-            }
 
-            taskList.innerHTML = tasks.map(task => {
-                const now = new Date();
-                const deadline = task.deadline ? new Date(task.deadline) : null;
-                const isExpired = deadline && deadline < now && !task.is_completed;
-                const isPunished = task.is_punished;
-
-                let statusClass = '';
-                let statusIcon = '';
-                if (isPunished) {
-                    statusClass = 'expired';
-                    statusIcon = '💀 処罰済み';
-                } else if (isExpired) {
-                    statusClass = 'expired';
-                    statusIcon = '⏰ 期限超過';
-                }
-
-                const deadlineStr = deadline ? 
-                    deadline.toLocaleString('ja-JP', { year: 'numeric', month: '2-digit', day: '2-digit', hour: '2-digit', minute: '2-digit' }) : 
-                    '期限なし';
-
-                return `
-                    <li class="task-item ${statusClass}">
-                        <div class="task-info">
-                            <span class="task-name">${escapeHtml(task.title)}</span>
-                            <div class="task-meta">
-                                <span class="deadline">⏱️ ${deadlineStr}</span>
-                                <span class="penalty">🎯 ${escapeHtml(task.penalty_text)}</span>
-                            </div>
-                            ${statusIcon ? `<div class="punished-msg">${statusIcon}</div>` : ''}
-                        </div>
-                        <div class="task-actions">
-                            <a href="/edit/${task.id}" class="edit-btn" title="編集">✏️</a>
-                            <form method="post" action="/delete/${task.id}" style="margin: 0;">
-                                <button type="submit" class="delete-btn" onclick="return confirmDelete('${escapeHtml(task.title)}')">
-                                    ✅
-                                </button>
-                            </form>
-                        </div>
-                    </li>
-                `;
-            }).join('');
-        })
-        .catch(error => {
-            console.error('タスク読み込みエラー:', error);
-            taskList.innerHTML = '<li class="no-task">タスクの読み込みに失敗しました。</li>';
-        });
+    if (!Array.isArray(tasks) || tasks.length === 0) {
+        taskList.innerHTML = '<li class="no-task">現在、タスクはありません。</li>';
+        return;
+    }
+
+    taskList.innerHTML = tasks.map(task => {
+        const now = new Date();
+        const deadline = task.deadline ? new Date(task.deadline) : null;
+        const isExpired = deadline && deadline < now && !task.is_completed;
+        const isPunished = task.is_punished;
+
+        let statusClass = '';
+        let statusIcon = '';
+        if (isPunished) {
+            statusClass = 'expired';
+            statusIcon = '💀 処罰済み';
+        } else if (isExpired) {
+            statusClass = 'expired';
+            statusIcon = '⏰ 期限超過';
+        }
+
+        const deadlineStr = deadline ? 
+            deadline.toLocaleString('ja-JP', { year: 'numeric', month: '2-digit', day: '2-digit', hour: '2-digit', minute: '2-digit' }) : 
+            '期限なし';
+
+        return `
+            <li class="task-item ${statusClass}">
+                <div class="task-info">
+                    <span class="task-name">${escapeHtml(task.title)}</span>
+                    <div class="task-meta">
+                        <span class="deadline">⏱️ ${deadlineStr}</span>
+                        <span class="penalty">🎯 ${escapeHtml(task.penalty_text)}</span>
+                    </div>
+                    ${statusIcon ? `<div class="punished-msg">${statusIcon}</div>` : ''}
+                </div>
+                <div class="task-actions">
+                    <a href="/edit/${task.id}" class="edit-btn" title="編集">✏️</a>
+                    <form method="post" action="/delete/${task.id}" style="margin: 0;">
+                        <button type="submit" class="delete-btn" onclick="return confirmDelete('${escapeHtml(task.title)}')">
+                            ✅
+                        </button>
+                    </form>
+                </div>
+            </li>
+        `;
+    }).join('');
 }
 
 function checkForPunishments() {
-    fetch('/check_punishments')
-        .then(response => response.json())
-        .then(punishedTasks => {
-            if (punishedTasks && punishedTasks.length > 0) {
-                const newPunishments = punishedTasks.filter(task => 
-                    !processedPunishments.has(task.id)
-                );
-
-                newPunishments.forEach(task => {
-                    processedPunishments.add(task.id);
-                    showFakeTweet(task);
-                });
-            }
-        })
-        .catch(error => console.error('チェックエラー:', error));
+    // カーソル未取得の間はサーバー側の受信確認位置から取得する
+    const url = punishmentCursor === null ?
+        '/check_punishments' :
+        `/check_punishments?since=${punishmentCursor}`;
+
+    return fetchJson(url, data => {
+        if (!data || !Array.isArray(data.punishments)) return;
+
+        data.punishments.forEach(task => showFakeTweet(task));
+        if (data.punishments.length > 0) {
+            acknowledgePunishments(data.cursor);
+        }
+        punishmentCursor = data.cursor;
+    });
+}
+
+function acknowledgePunishments(cursor) {
+    fetch('/check_punishments/ack', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ cursor: cursor })
+    }).catch(error => console.error('受信確認エラー:', error));
 }
 
 function showFakeTweet(task) {
@@ -152,115 +294,97 @@ function closeTweetModal() {
     }, 500);
 }
 
-function updateStats() {
-    fetch('/api/stats')
-        .then(response => {
-            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-            return response.json();
-        })
-        .then(stats => {
-            if (stats && typeof stats === 'object') {
-                document.getElementById('lazynessScore').textContent = 
-                    (stats.laziness_score || 0).toFixed(1) + '%';
-                document.getElementById('completedCount').textContent = 
-                    stats.completed_tasks || 0;
-                document.getElementById('streakCount').textContent = 
-                    (stats.current_streak || 0) + '日';
-                document.getElementById('punishedCount').textContent = 
-                    stats.punished_tasks || 0;
-            }
-        })
-        .catch(error => console.error('統計更新エラー:', error));
-}
-
-function refreshTaskList() {
-    renderTaskList();
+function renderStats(stats, rank) {
+    if (!stats || typeof stats !== 'object') return;
+
+    document.getElementById('lazynessScore').textContent = 
+        (stats.laziness_score || 0).toFixed(1) + '%';
+    document.getElementById('completedCount').textContent = 
+        stats.completed_tasks || 0;
+    document.getElementById('streakCount').textContent = 
+        (stats.current_streak || 0) + '日';
+    document.getElementById('punishedCount').textContent = 
+        stats.punished_tasks || 0;
+    document.getElementById('rankValue').textContent = 
+        rank ? rank + '位' : '-';
 }
 
 // ===== ランキング =====
 function loadRankings() {
-    fetch('/api/rankings')
-        .then(response => response.json())
-        .then(rankings => {
-            const tbody = document.getElementById('rankingBody');
-            if (!rankings || rankings.length === 0) {
-                tbody.innerHTML = '<tr><td colspan="5" style="text-align:center;">ランキングデータがありません</td></tr>';
-                return;
-            }
-
-            tbody.innerHTML = rankings.map(r => `
-                <tr>
-                    <td class="rank">${r.rank}</td>
-                    <td>${escapeHtml(r.username)}</td>
-                    <td class="score">${r.laziness_score.toFixed(1)}%</td>
-                    <td>${r.completed_tasks}</td>
-                    <td>${r.punished_tasks}</td>
-                </tr>
-            `).join('');
-        })
-        .catch(error => console.error('ランキング読み込みエラー:', error));
+    return fetchJson('/api/rankings', rankings => {
+        const tbody = document.getElementById('rankingBody');
+        if (!rankings || rankings.length === 0) {
+            tbody.innerHTML = '<tr><td colspan="5" style="text-align:center;">ランキングデータがありません</td></tr>';
+            return;
+        }
+
+        tbody.innerHTML = rankings.map(r => `
+            <tr>
+                <td class="rank">${r.rank}</td>
+                <td>${escapeHtml(r.username)}</td>
+                <td class="score">${r.laziness_score.toFixed(1)}%</td>
+                <td>${r.completed_tasks}</td>
+                <td>${r.punished_tasks}</td>
+            </tr>
+        `).join('');
+    });
 }
 
 // ===== バッジ =====
-function loadBadges() {
-    fetch('/api/badges')
-        .then(response => response.json())
-        .then(badges => {
-            const grid = document.getElementById('badgesGrid');
-            if (!badges || badges.length === 0) {
-                grid.innerHTML = '<p style="text-align:center; color: #aaa;">まだバッジを獲得していません</p>';
-                return;
-            }
+function renderBadges(badges) {
+    const grid = document.getElementById('badgesGrid');
+    if (!badges || badges.length === 0) {
+        grid.innerHTML = '<p style="text-align:center; color: #aaa;">まだバッジを獲得していません</p>';
+        return;
+    }
 
-            grid.innerHTML = badges.map(badge => `
-                <div class="badge-card">
-                    <div class="badge-icon">${badge.icon}</div>
-                    <div class="badge-name">${escapeHtml(badge.name)}</div>
-                    <div class="badge-date">${new Date(badge.unlocked_at).toLocaleDateString('ja-JP')}</div>
-                </div>
-            `).join('');
-        })
-        .catch(error => console.error('バッジ読み込みエラー:', error));
+    grid.innerHTML = badges.map(badge => `
+        <div class="badge-card">
+            <div class="badge-icon">${badge.icon}</div>
+            <div class="badge-name">${escapeHtml(badge.name)}</div>
+            <div class="badge-date">${new Date(badge.unlocked_at).toLocaleDateString('ja-JP')}</div>
+        </div>
+    `).join('');
 }
 
 // ===== グループ =====
-function loadGroups() {
-    fetch('/api/groups')
-        .then(response => response.json())
-        .then(groups => {
-            const myGroupsList = document.getElementById('myGroupsList');
-            
-            if (!groups || groups.length === 0) {
-                myGroupsList.innerHTML = '<p style="text-align:center; color: #aaa; margin-top: 20px;">参加しているグループはありません</p>';
-                return;
-            }
+function renderGroups(groups) {
+    const myGroupsList = document.getElementById('myGroupsList');
+    
+    if (!groups || groups.length === 0) {
+        myGroupsList.innerHTML = '<p style="text-align:center; color: #aaa; margin-top: 20px;">参加しているグループはありません</p>';
+        return;
+    }
 
-            myGroupsList.innerHTML = `
-                <div style="margin-top: 30px;">
-                    <h3>📍 参加中のグループ</h3>
-                    <div id="groupsContainer" style="display: grid; gap: 15px;">
-                        ${groups.map(group => `
-                            <div class="group-card">
-                                <div class="group-header">
-                                    <h4>${escapeHtml(group.name)}</h4>
-                                    <span class="invite-code">招待コード: <code>${group.invite_code}</code></span>
-                                </div>
-                                <div class="group-actions-buttons">
-                                    <button onclick="showGroupRanking(${group.id}, '${escapeHtml(group.name)}')" class="btn-view-ranking">📊 ランキング表示</button>
-                                    <form method="post" action="/group/${group.id}/leave" style="display: inline;">
-                                        <button type="submit" class="btn-leave-group" onclick="return confirm('本当に脱退しますか？')">👋 脱退</button>
-                                    </form>
-                                </div>
-                                <div id="ranking-${group.id}" style="margin-top: 15px; display: none;">
-                                    <!-- ランキングがここに表示される -->
-                                </div>
-                            </div>
-                        `).join('')}
+    myGroupsList.innerHTML = `
+        <div style="margin-top: 30px;">
+            <h3>📍 参加中のグループ</h3>
+            <div id="groupsContainer" style="display: grid; gap: 15px;">
+                ${groups.map(group => `
+                    <div class="group-card">
+                        <div class="group-header">
+                            <h4>${escapeHtml(group.name)}${group.has_webhook ? ' <span title="処刑をこのグループの Discord に投稿します">🔔</span>' : ''}</h4>
+                            <span class="invite-code">招待コード: <code>${group.invite_code}</code></span>
+                        </div>
+                        <div class="group-actions-buttons">
+                            <button type="button" data-group-id="${group.id}" data-group-name="${escapeHtml(group.name)}" class="btn-view-ranking">📊 ランキング表示</button>
+                            <form method="post" action="/group/${group.id}/leave" style="display: inline;">
+                                <button type="submit" class="btn-leave-group" onclick="return confirm('本当に脱退しますか？')">👋 脱退</button>
+                            </form>
+                        </div>
+                        ${group.is_owner ? `
+                        <form method="post" action="/group/${group.id}/webhook" style="margin-top: 10px; display: flex; gap: 8px;">
+                            <input type="url" name="webhook_url" placeholder="Discord Webhook URL（空欄で解除）" maxlength="500" style="flex: 1;">
+                            <button type="submit" class="btn-secondary">🔔 通知先を設定</button>
+                        </form>` : ''}
+                        <div id="ranking-${group.id}" style="margin-top: 15px; display: none;">
+                            <!-- ランキングがここに表示される -->
+                        </div>
                     </div>
-                </div>
-            `;
-        })
-        .catch(error => console.error('グループ読み込みエラー:', error));
+                `).join('')}
+            </div>
+        </div>
+    `;
 }
 
 function showGroupRanking(groupId, groupName) {
@@ -326,6 +450,24 @@ function showGroupJoinForm() {
 }
 
 // ===== ユーティリティ =====
+function showFlash(message, category) {
+    let container = document.getElementById('flashContainer');
+    if (!container) {
+        container = document.createElement('div');
+        container.id = 'flashContainer';
+        container.className = 'flash-container';
+        document.body.appendChild(container);
+    }
+
+    const item = document.createElement('div');
+    item.className = `flash-message flash-${category}`;
+    item.innerHTML = `
+        <span>${escapeHtml(message)}</span>
+        <button class="flash-close" onclick="this.parentElement.remove()">&times;</button>
+    `;
+    container.appendChild(item);
+}
+
 function closeModal(modalId) {
     const modal = document.getElementById(modalId);
     if (modal) {
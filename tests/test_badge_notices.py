@@ -0,0 +1,57 @@
+"""ワーカーが解除したバッジがダッシュボードで通知されることの回帰テスト
+
+使い方:
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# app の import 前に、一時ファイルの DB を指定してスケジューラを止めておく
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='sg-test-'), 'test.db')}"
+os.environ['SCHEDULER_ENABLED'] = '0'
+
+import app as app_module  # noqa: E402
+
+db = app_module.db
+Task = app_module.Task
+
+
+class BadgeNoticeTest(unittest.TestCase):
+    def setUp(self):
+        self.context = app_module.app.app_context()
+        self.context.push()
+        db.drop_all()
+        db.create_all()
+        self.user = app_module.User(username='badger', password_hash='x')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def test_badge_unlocked_by_worker_is_in_dashboard(self):
+        db.session.add_all([
+            Task(user_id=self.user.id, title=f'タスク {i}', is_completed=True, completed_at=datetime.now())
+            for i in range(10)
+        ])
+        db.session.commit()
+
+        # ワーカーの user_stats ジョブと同じく、リクエストの外で再計算する
+        app_module.update_user_stats(self.user.id)
+
+        dashboard = app_module.build_dashboard(self.user)
+        messages = [b['message'] for b in dashboard['unlocked_badges']]
+        self.assertIn('🎖️ バッジ解除: ✨ 10個完了達成者', messages)
+        self.assertEqual(len({b['id'] for b in dashboard['unlocked_badges']}), len(messages))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""cache.py のタグ無効化の回帰テスト
+
+使い方:
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from cache import MISSING, Cache, SQLiteBackend  # noqa: E402
+
+
+class TagInvalidationTest(unittest.TestCase):
+    def test_invalidating_a_tag_expires_only_its_entries(self):
+        cache = Cache()
+        cache.set('rankings', [1, 2], ttl=60, tags=('rankings',))
+        cache.set('rank:1', 1, ttl=60, tags=('rankings', 'user:1'))
+        cache.set('stats:1', {'score': 10}, ttl=60, tags=('user:1',))
+
+        cache.invalidate_tags('rankings')
+
+        self.assertIs(cache.get('rankings'), MISSING)
+        self.assertIs(cache.get('rank:1'), MISSING)
+        self.assertEqual(cache.get('stats:1'), {'score': 10})
+
+    def test_value_computed_during_invalidation_is_not_kept(self):
+        cache = Cache()
+
+        # 計算中に別のリクエストがデータを変えて無効化した
+        def compute():
+            cache.invalidate_tags('rankings')
+            return '古い値'
+
+        self.assertEqual(cache.get_or_set('rankings', compute, ttl=60, tags=('rankings',)), '古い値')
+        self.assertIs(cache.get('rankings'), MISSING)
+        self.assertEqual(cache.get_or_set('rankings', lambda: '新しい値', ttl=60, tags=('rankings',)), '新しい値')
+        self.assertEqual(cache.get('rankings'), '新しい値')
+
+    def test_invalidation_reaches_other_processes_through_shared_backend(self):
+        path = os.path.join(tempfile.mkdtemp(prefix='sg-test-'), 'cache.sqlite3')
+        # 別プロセスの代わりに、同じファイルを共有する2つの Cache を使う
+        writer = Cache(shared=SQLiteBackend(path), tag_sync_interval=0)
+        reader = Cache(shared=SQLiteBackend(path), tag_sync_interval=0)
+
+        writer.set('rankings', [1, 2], ttl=60, tags=('rankings',))
+        self.assertEqual(reader.get('rankings'), [1, 2])
+
+        writer.invalidate_tags('rankings')
+        # reader のプロセス内 LRU に残った値も、共有タグの版が進んだので使わない
+        self.assertIs(reader.get('rankings'), MISSING)
+
+
+if __name__ == '__main__':
+    unittest.main()
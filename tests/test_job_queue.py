@@ -0,0 +1,216 @@
+"""ジョブキュー（投入・取得・リトライ・デッドレター）の回帰テスト
+
+使い方:
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# app の import 前に、一時ファイルの DB を指定してスケジューラを止めておく
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='sg-test-'), 'test.db')}"
+os.environ['SCHEDULER_ENABLED'] = '0'
+
+import app as app_module  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+db = app_module.db
+Job = app_module.Job
+DeadJob = app_module.DeadJob
+PunishmentNotice = app_module.PunishmentNotice
+Task = app_module.Task
+
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.context = app_module.app.app_context()
+        self.context.push()
+        db.drop_all()
+        db.create_all()
+        self.user = app_module.User(username='queuer', password_hash='x')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def register(self, kind, handler, on_dead=None):
+        app_module.job_handler(kind, on_dead=on_dead)(handler)
+        self.addCleanup(app_module.JOB_HANDLERS.pop, kind, None)
+        self.addCleanup(app_module.JOB_DEAD_HANDLERS.pop, kind, None)
+
+    def enqueue(self, kind, **kwargs):
+        job = app_module.enqueue_job(kind, {}, **kwargs)
+        db.session.commit()
+        return job.id
+
+    def make_due(self, job_id):
+        # バックオフを待たずに次の試行を取れるようにする
+        Job.query.filter_by(id=job_id).update({'run_at': datetime.now() - timedelta(seconds=1)})
+        db.session.commit()
+
+    def run_next(self):
+        job = app_module.claim_job('test-worker')
+        self.assertIsNotNone(job)
+        return app_module.run_job(job)
+
+    def test_claim_is_exclusive(self):
+        job_id = self.enqueue('noop')
+        claimed = []
+
+        def claim(worker_id):
+            with app_module.app.app_context():
+                job = app_module.claim_job(worker_id)
+                if job:
+                    claimed.append((worker_id, job.id))
+
+        threads = [threading.Thread(target=claim, args=(f'worker-{i}',)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(claimed), 1)
+        job = db.session.get(Job, job_id)
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('running', 1, claimed[0][0]))
+        self.assertIsNone(app_module.claim_job('late-worker'))
+
+    def test_failure_is_retried_with_backoff(self):
+        self.register('flaky', lambda payload: 1 / 0)
+        job_id = self.enqueue('flaky')
+
+        for attempts, backoff in ((1, 2), (2, 4)):
+            started = datetime.now()
+            self.assertFalse(self.run_next())
+            job = db.session.get(Job, job_id)
+            self.assertEqual((job.status, job.attempts), ('queued', attempts))
+            self.assertIn('ZeroDivisionError', job.last_error)
+            self.assertAlmostEqual((job.run_at - started).total_seconds(), backoff, delta=1)
+            # バックオフの間は取得されない
+            self.assertIsNone(app_module.claim_job('test-worker'))
+            self.make_due(job_id)
+
+    def test_retry_later_does_not_count_an_attempt(self):
+        def rate_limited(payload):
+            raise app_module.RetryLater(30, 'レート制限')
+        self.register('rate_limited', rate_limited)
+        job_id = self.enqueue('rate_limited', max_attempts=1)
+
+        for _ in range(3):
+            started = datetime.now()
+            self.assertFalse(self.run_next())
+            job = db.session.get(Job, job_id)
+            self.assertEqual((job.status, job.attempts), ('queued', 0))
+            self.assertAlmostEqual((job.run_at - started).total_seconds(), 30, delta=1)
+            self.make_due(job_id)
+        self.assertEqual(DeadJob.query.count(), 0)
+
+    def test_dead_letter_after_max_attempts(self):
+        dead_payloads = []
+        self.register('doomed', lambda payload: 1 / 0, on_dead=dead_payloads.append)
+        job_id = app_module.enqueue_job('doomed', {'n': 1}, max_attempts=2, idempotency_key='doomed:1').id
+        db.session.commit()
+
+        self.assertFalse(self.run_next())
+        self.make_due(job_id)
+        self.assertFalse(self.run_next())
+
+        self.assertIsNone(db.session.get(Job, job_id))
+        dead = DeadJob.query.one()
+        self.assertEqual((dead.job_id, dead.kind, dead.attempts, dead.idempotency_key), (job_id, 'doomed', 2, 'doomed:1'))
+        self.assertIn('ZeroDivisionError', dead.last_error)
+        self.assertEqual(dead_payloads, [{'n': 1}])
+
+    def add_notices(self, count):
+        group = app_module.Group(name='通知先', invite_code='NOTICE', created_by=self.user.id,
+                                 webhook_url='https://discord.com/api/webhooks/1/test')
+        db.session.add(group)
+        db.session.flush()
+        destination = f'group:{group.id}'
+        for i in range(count):
+            task = Task(user_id=self.user.id, title=f'処刑 {i}', penalty_text='罰', is_punished=True)
+            db.session.add(task)
+            db.session.flush()
+            db.session.add(PunishmentNotice(task_id=task.id, destination=destination))
+        db.session.commit()
+        return destination
+
+    def posted_titles(self, post):
+        return sorted(field['name'] for call in post.call_args_list
+                      for embed in call.args[1]['embeds'] for field in embed['fields'])
+
+    def test_digest_skips_notices_claimed_by_another_job(self):
+        destination = self.add_notices(3)
+        first, second, third = PunishmentNotice.query.order_by(PunishmentNotice.id).all()
+        # 1件は投稿中の別ジョブが確保している。もう1件は確保したジョブが落ちて期限切れになっている
+        first.claimed_by, first.claimed_at = 'other', datetime.now()
+        second.claimed_by = 'crashed'
+        second.claimed_at = datetime.now() - timedelta(seconds=app_module.app.config['JOB_LOCK_TIMEOUT'] + 1)
+        db.session.commit()
+
+        with mock.patch.object(app_module, 'post_discord_webhook') as post:
+            app_module.handle_webhook_digest({'destination': destination})
+
+        self.assertEqual(self.posted_titles(post), ['queuer「処刑 1」', 'queuer「処刑 2」'])
+        sent = {n.id: n.sent_at is not None for n in PunishmentNotice.query}
+        self.assertEqual(sent, {first.id: False, second.id: True, third.id: True})
+
+    def test_digest_releases_claims_when_posting_fails(self):
+        destination = self.add_notices(2)
+
+        with mock.patch.object(app_module, 'post_discord_webhook', side_effect=RuntimeError('HTTP 500')):
+            with self.assertRaises(RuntimeError):
+                app_module.handle_webhook_digest({'destination': destination})
+
+        notices = PunishmentNotice.query.all()
+        self.assertTrue(all(n.claimed_by is None and n.sent_at is None for n in notices))
+        with mock.patch.object(app_module, 'post_discord_webhook') as post:
+            app_module.handle_webhook_digest({'destination': destination})
+        self.assertEqual(len(self.posted_titles(post)), 2)
+
+    def test_concurrent_enqueue_with_same_key_returns_existing_job(self):
+        task = Task(user_id=self.user.id, title='褒められるタスク')
+        db.session.add(task)
+        db.session.commit()
+        key = f'praise:{task.id}'
+
+        # 既存の確認を通った直後に、別のリクエストが同じキーで積んでコミットした状態を作る
+        raced = []
+
+        def enqueue_from_other_request(session, flush_context, instances):
+            if raced or not any(isinstance(obj, Job) for obj in session.new):
+                return
+            raced.append(True)
+            with db.engine.begin() as conn:
+                conn.execute(Job.__table__.insert().values(
+                    kind='praise', payload=json.dumps({'task_id': task.id}), priority=100,
+                    idempotency_key=key, max_attempts=5, status='queued', attempts=0,
+                    run_at=datetime.now(), created_at=datetime.now()
+                ))
+        event.listen(db.session, 'before_flush', enqueue_from_other_request)
+        self.addCleanup(event.remove, db.session, 'before_flush', enqueue_from_other_request)
+
+        # delete_task と同じ順で、積んだ後にタスクを完了にする
+        job = app_module.enqueue_job('praise', {'task_id': task.id}, idempotency_key=key, user_id=self.user.id)
+        task.is_completed = True
+        db.session.commit()
+
+        self.assertTrue(raced)
+        self.assertEqual(job.idempotency_key, key)
+        self.assertEqual(Job.query.filter_by(idempotency_key=key).count(), 1)
+        # 巻き戻すのはセーブポイントだけなので、同じトランザクションの変更は失われない
+        self.assertTrue(db.session.get(Task, task.id).is_completed)
+
+
+if __name__ == '__main__':
+    unittest.main()
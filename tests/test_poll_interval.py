@@ -0,0 +1,67 @@
+"""処刑ポーリング間隔 (X-Poll-Interval) の回帰テスト
+
+使い方:
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# app の import 前に、一時ファイルの DB を指定してスケジューラを止めておく
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='sg-test-'), 'test.db')}"
+os.environ['SCHEDULER_ENABLED'] = '0'
+
+import app as app_module  # noqa: E402
+
+db = app_module.db
+Task = app_module.Task
+
+
+class PunishmentPollTest(unittest.TestCase):
+    def setUp(self):
+        app = app_module.app
+        self.low = app.config['POLL_MIN_SECONDS']
+        self.high = app.config['POLL_MAX_SECONDS']
+        self.context = app.app_context()
+        self.context.push()
+        db.drop_all()
+        db.create_all()
+        self.user = app_module.User(username='poller', password_hash='x')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def add_task(self, deadline):
+        db.session.add(Task(user_id=self.user.id, title='期限付きタスク', deadline=deadline))
+        db.session.commit()
+
+    def test_no_deadline_polls_slowly(self):
+        self.assertEqual(app_module.recommend_punishment_poll(self.user.id), self.high)
+
+    def test_overdue_unpunished_task_polls_quickly(self):
+        # スケジューラが遅れて 2 分過ぎても処刑されていない
+        self.add_task(datetime.now() - timedelta(minutes=2))
+        self.assertEqual(app_module.recommend_punishment_poll(self.user.id), self.low)
+
+    def test_unacked_punishment_polls_quickly(self):
+        self.user.punish_seq = 3
+        self.user.punish_ack_seq = 2
+        db.session.commit()
+        self.assertEqual(app_module.recommend_punishment_poll(self.user.id), self.low)
+
+        self.user.punish_ack_seq = 3
+        db.session.commit()
+        self.assertEqual(app_module.recommend_punishment_poll(self.user.id), self.high)
+
+
+if __name__ == '__main__':
+    unittest.main()
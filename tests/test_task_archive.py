@@ -0,0 +1,100 @@
+"""tasks のアーカイブで id が使い回されないことの回帰テスト
+
+使い方:
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# app の import 前に、一時ファイルの DB を指定してスケジューラを止めておく
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='sg-test-'), 'test.db')}"
+os.environ['SCHEDULER_ENABLED'] = '0'
+
+import app as app_module  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.schema import CreateTable  # noqa: E402
+
+db = app_module.db
+Task = app_module.Task
+ArchivedTask = app_module.ArchivedTask
+
+
+class TaskArchiveTest(unittest.TestCase):
+    def setUp(self):
+        app = app_module.app
+        app.config['ARCHIVE_AFTER_DAYS'] = 0
+        app.config['ARCHIVE_BATCH_PAUSE'] = 0
+        self.context = app.app_context()
+        self.context.push()
+        db.drop_all()
+        db.create_all()
+        user = app_module.User(username='archiver', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def add_task(self, title, completed=False):
+        task = Task(user_id=self.user_id, title=title, is_completed=completed,
+                    completed_at=datetime.now() - timedelta(minutes=1) if completed else None)
+        db.session.add(task)
+        db.session.commit()
+        return task.id
+
+    def test_archived_task_id_is_not_reused(self):
+        first_id = self.add_task('最初のタスク', completed=True)
+        self.assertEqual(app_module.archive_finalized_tasks(), 1)
+
+        second_id = self.add_task('次のタスク', completed=True)
+        self.assertGreater(second_id, first_id)
+        self.assertEqual(app_module.archive_finalized_tasks(), 1)
+        self.assertEqual(ArchivedTask.query.count(), 2)
+        self.assertEqual(Task.query.count(), 0)
+
+    def test_archive_error_is_reported_not_raised(self):
+        task_id = self.add_task('アーカイブ済みと重なるタスク', completed=True)
+        db.session.add(ArchivedTask(id=task_id, user_id=self.user_id, title='重複'))
+        db.session.commit()
+
+        # スケジューラと同じく、アプリケーションコンテキストの外から呼ぶ
+        self.context.pop()
+        try:
+            self.assertEqual(app_module.archive_finalized_tasks(), 0)
+        finally:
+            self.context.push()
+        self.assertIsNotNone(db.session.get(Task, task_id))
+
+    def test_upgrade_schema_rebuilds_legacy_tasks_table(self):
+        # AUTOINCREMENT の無い以前の tasks を作り、id 3 がアーカイブと重なった状態にする
+        legacy_ddl = str(CreateTable(Task.__table__).compile(db.engine)).replace('AUTOINCREMENT', '')
+        with db.engine.begin() as conn:
+            conn.execute(text('DROP TABLE tasks'))
+            conn.execute(text(legacy_ddl))
+        db.session.add_all([
+            Task(id=1, user_id=self.user_id, title='残っているタスク'),
+            Task(id=3, user_id=self.user_id, title='使い回された id のタスク'),
+            ArchivedTask(id=3, user_id=self.user_id, title='アーカイブ済み', is_completed=True),
+        ])
+        db.session.commit()
+
+        app_module.upgrade_schema()
+
+        ddl = db.session.execute(text("SELECT sql FROM sqlite_master WHERE name = 'tasks'")).scalar()
+        self.assertIn('AUTOINCREMENT', ddl)
+        titles = dict(db.session.query(Task.id, Task.title))
+        self.assertEqual(titles, {1: '残っているタスク', 4: '使い回された id のタスク'})
+        self.assertEqual(self.add_task('新しいタスク'), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
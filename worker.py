@@ -0,0 +1,85 @@
+"""ジョブワーカーを Web サーバーとは別プロセスで起動する
+
+使い方:
+    python worker.py --threads 4
+    python worker.py --processes 2 --threads 4
+    python worker.py --with-scheduler   # 締め切りチェックもこのプロセスで動かす
+
+Web 側を JOB_WORKERS=0 で起動すれば、リクエスト処理とジョブ実行を別々に増減できる。
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import threading
+
+
+def initialize_database():
+    os.environ['SCHEDULER_ENABLED'] = '0'
+    from app import init_db
+    init_db()
+
+
+def run_worker_process(threads, with_scheduler):
+    # app の import 時にスケジューラが起動するので、先に環境変数で止めておく
+    os.environ['SCHEDULER_ENABLED'] = '1' if with_scheduler else '0'
+    from app import scheduler, start_job_workers
+
+    stop_event = threading.Event()
+
+    def stop(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    workers = start_job_workers(threads, stop_event)
+    print(f"👷 ワーカー起動 (pid={os.getpid()}, threads={threads}, scheduler={'on' if with_scheduler else 'off'})")
+    while not stop_event.is_set():
+        stop_event.wait(1)
+
+    # 実行中のジョブが終わるまで待ってから終了する
+    if scheduler.running:
+        scheduler.shutdown(wait=True)
+    for worker in workers:
+        worker.join(timeout=30)
+    print(f"👋 ワーカー停止 (pid={os.getpid()})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ジョブワーカーを起動します')
+    parser.add_argument('--threads', type=int, default=4, help='プロセスあたりのワーカースレッド数')
+    parser.add_argument('--processes', type=int, default=1, help='ワーカープロセス数')
+    parser.add_argument('--with-scheduler', action='store_true',
+                        help='締め切りチェックのスケジューラもこのワーカーで動かす（最初のプロセスのみ）')
+    args = parser.parse_args()
+
+    # 複数プロセスが同時に create_all しないよう、テーブル作成は起動前に一度だけ行う
+    initializer = multiprocessing.Process(target=initialize_database)
+    initializer.start()
+    initializer.join()
+
+    if args.processes <= 1:
+        run_worker_process(args.threads, args.with_scheduler)
+        return
+
+    processes = [
+        multiprocessing.Process(target=run_worker_process, args=(args.threads, args.with_scheduler and i == 0))
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def stop(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()